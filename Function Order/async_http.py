@@ -0,0 +1,112 @@
+import asyncio
+import time
+import weakref
+
+import aiohttp
+
+from resilient_http import RETRY_STATUSES, CircuitOpenError, backoff_delay, endpoint_settings, get_breaker
+from telemetry import increment
+
+MAX_CONNECTIONS = 100
+MAX_CONNECTIONS_PER_HOST = 50
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=15, sock_connect=3.05)
+
+# aiohttp sessions are bound to the event loop they were created on, so keep
+# one pooled session per loop rather than one per call
+_sessions = weakref.WeakKeyDictionary()
+
+
+def get_session():
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=MAX_CONNECTIONS,
+            limit_per_host=MAX_CONNECTIONS_PER_HOST,
+            ttl_dns_cache=300,
+        )
+        session = aiohttp.ClientSession(connector=connector, timeout=REQUEST_TIMEOUT)
+        _sessions[loop] = session
+    return session
+
+
+async def get_json(url, params=None, upstream="maps"):
+    # Returns (status, parsed body or None). Same timeouts, retries, circuit
+    # breaker and hedging as resilient_http.ResilientClient for `upstream`.
+    settings = endpoint_settings(upstream)
+    breaker = get_breaker(upstream)
+    deadline = time.monotonic() + settings["deadline"]
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            increment(f"http.{upstream}.rejected")
+            raise CircuitOpenError(f"{upstream} circuit is open")
+        # A backoff sleep can overshoot the deadline
+        remaining = max(deadline - time.monotonic(), 0.001)
+        timeout = aiohttp.ClientTimeout(
+            total=remaining,
+            sock_connect=min(settings["connect_timeout"], remaining),
+            sock_read=min(settings["read_timeout"], remaining),
+        )
+        status = None
+        try:
+            if settings["hedge_after"] > 0:
+                status, body = await _hedged(url, params, timeout, settings["hedge_after"], upstream)
+            else:
+                status, body = await _get_json(url, params, timeout)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            breaker.record_failure()
+            error = e
+        except BaseException:
+            # A body that is not JSON, cancellation, ... still settle a
+            # half-open trial
+            breaker.record_failure()
+            raise
+        else:
+            if status not in RETRY_STATUSES:
+                breaker.record_success()
+                return status, body
+            breaker.record_failure()
+
+        attempt += 1
+        delay = backoff_delay(attempt, settings["backoff"], settings["max_backoff"])
+        if attempt > settings["retries"] or time.monotonic() + delay >= deadline:
+            if status is not None:
+                return status, None
+            raise error
+        increment(f"http.{upstream}.retries")
+        await asyncio.sleep(delay)
+
+
+async def _get_json(url, params, timeout):
+    async with get_session().get(url, params=params, timeout=timeout) as response:
+        if response.status != 200:
+            return response.status, None
+        return response.status, await response.json(content_type=None)
+
+
+async def _hedged(url, params, timeout, hedge_after, upstream):
+    # First answer wins; the slower copy is cancelled
+    tasks = [asyncio.ensure_future(_get_json(url, params, timeout))]
+    done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+    if not done:
+        increment(f"http.{upstream}.hedged")
+        tasks.append(asyncio.ensure_future(_get_json(url, params, timeout)))
+    pending = set(tasks)
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def close_sessions():
+    for session in list(_sessions.values()):
+        await session.close()
@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from telemetry import increment
+
+DEDUP_WINDOW_SIZE = int(os.environ.get("DEDUP_WINDOW_SIZE", "100000"))
+# Event Grid retries for up to 24 hours
+DEDUP_TTL = float(os.environ.get("DEDUP_TTL", str(24 * 3600)))
+# Set DEDUP_TABLE_CONNECTION (e.g. "UseDevelopmentStorage=true" for Azurite)
+# to share seen keys between instances through Table storage
+DEDUP_TABLE_CONNECTION = os.environ.get("DEDUP_TABLE_CONNECTION", "")
+DEDUP_TABLE_NAME = os.environ.get("DEDUP_TABLE_NAME", "processedevents")
+
+
+def event_keys(event_id, order_id=None, status=None):
+    # A redelivered event repeats its id; a re-published one repeats the
+    # order's (order_id, Status)
+    keys = [f"event:{event_id}"]
+    if order_id is not None and status is not None:
+        keys.append(f"order:{order_id}:{status}")
+    return keys
+
+
+class EventDeduplicator:
+    # Drops events whose keys were already claimed. Recent keys live in a
+    # bounded in-memory window, so a duplicate delivered to the same worker
+    # is caught with a dict lookup; a store (see dedup_table.py) makes claims
+    # visible across instances and restarts.
+
+    def __init__(self, store=None, max_entries=DEDUP_WINDOW_SIZE, ttl=DEDUP_TTL):
+        self.store = store
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self.claimed = 0
+        self.memory_hits = 0
+        self.store_hits = 0
+
+    def claim(self, keys):
+        # True the first time any of these keys is seen, False for a duplicate
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                expires = self._seen.get(key)
+                if expires is not None and expires > now:
+                    self.memory_hits += 1
+                    increment("dedup.duplicates")
+                    return False
+            # Remembered before asking the store, so a concurrent duplicate in
+            # this worker is already caught here
+            for key in keys:
+                self._remember(key, now + self.ttl)
+        try:
+            duplicate = self.store is not None and not self.store.claim(keys, now + self.ttl)
+        except Exception:
+            # Nothing was claimed, so a redelivery must not look like a
+            # duplicate
+            with self._lock:
+                for key in keys:
+                    self._seen.pop(key, None)
+            raise
+        if duplicate:
+            with self._lock:
+                self.store_hits += 1
+            increment("dedup.duplicates")
+            return False
+        with self._lock:
+            self.claimed += 1
+        return True
+
+    def forget(self, keys):
+        # Lets a redelivery through after processing failed
+        with self._lock:
+            for key in keys:
+                self._seen.pop(key, None)
+        if self.store is not None:
+            self.store.forget(keys)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "claimed": self.claimed,
+                "memory_hits": self.memory_hits,
+                "store_hits": self.store_hits,
+                "entries": len(self._seen),
+            }
+
+    def _remember(self, key, expires):
+        self._seen[key] = expires
+        self._seen.move_to_end(key)
+        while len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+
+
+def create_deduplicator():
+    if not DEDUP_TABLE_CONNECTION:
+        return EventDeduplicator()
+    from dedup_table import TableDedupStore
+    return EventDeduplicator(TableDedupStore.from_connection_string(DEDUP_TABLE_CONNECTION, DEDUP_TABLE_NAME))
+
+
+_deduplicator = None
+_deduplicator_lock = threading.Lock()
+
+
+def get_deduplicator():
+    global _deduplicator
+    with _deduplicator_lock:
+        if _deduplicator is None:
+            _deduplicator = create_deduplicator()
+        return _deduplicator
@@ -0,0 +1,82 @@
+import hashlib
+import time
+
+from azure.core import MatchConditions
+from azure.core.exceptions import HttpResponseError, ResourceExistsError, ResourceNotFoundError
+from azure.data.tables import TableServiceClient, UpdateMode
+
+# Rows are spread over this many partitions by key hash
+PARTITIONS = 16
+
+
+class TableDedupStore:
+    # Claimed keys as rows in Azure Table storage (or the local Azurite
+    # emulator). A claim is an insert, so of two instances racing on the
+    # same key exactly one succeeds. Expired rows are taken over with an
+    # ETag-conditional update instead of being cleaned up separately.
+
+    def __init__(self, table_client):
+        self.table = table_client
+
+    @classmethod
+    def from_connection_string(cls, connection_string, table_name="processedevents"):
+        service = TableServiceClient.from_connection_string(connection_string)
+        return cls(service.create_table_if_not_exists(table_name))
+
+    def claim(self, keys, expires):
+        # False as soon as one key is held by an unexpired row. Keys claimed
+        # before that (or before an error) are given back, so other
+        # instances are not locked out of an event nobody processes.
+        claimed = []
+        try:
+            for key in keys:
+                if not self._claim_key(key, expires):
+                    self.forget(claimed)
+                    return False
+                claimed.append(key)
+        except Exception:
+            self.forget(claimed)
+            raise
+        return True
+
+    def forget(self, keys):
+        for key in keys:
+            partition_key, row_key = self._row(key)
+            try:
+                self.table.delete_entity(partition_key, row_key)
+            except ResourceNotFoundError:
+                pass
+
+    def _claim_key(self, key, expires):
+        partition_key, row_key = self._row(key)
+        entity = {"PartitionKey": partition_key, "RowKey": row_key, "Expires": expires}
+        try:
+            self.table.create_entity(entity)
+            return True
+        except ResourceExistsError:
+            pass
+        try:
+            existing = self.table.get_entity(partition_key, row_key)
+        except ResourceNotFoundError:
+            # Forgotten in the meantime
+            return self._claim_key(key, expires)
+        if existing.get("Expires", 0) > time.time():
+            return False
+        try:
+            self.table.update_entity(
+                entity,
+                mode=UpdateMode.REPLACE,
+                etag=existing.metadata["etag"],
+                match_condition=MatchConditions.IfNotModified,
+            )
+            return True
+        except HttpResponseError as e:
+            # 412: another instance took over the expired row first
+            if e.status_code != 412:
+                raise
+            return False
+
+    def _row(self, key):
+        # RowKeys may not contain / \ # ?, so store a digest of the key
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return f"{int(digest[:4], 16) % PARTITIONS:02d}", digest
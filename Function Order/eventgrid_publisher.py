@@ -0,0 +1,181 @@
+import atexit
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from fast_json import dumps
+from resilient_http import CircuitBreaker, ResilientClient, endpoint_settings
+from telemetry import get_logger, increment, timed
+
+# Event Grid accepts arrays of events up to 1 MB per request
+MAX_BATCH_BYTES = 1024 * 1024
+MAX_BATCH_EVENTS = 100
+MAX_DELAY_SECONDS = 0.01
+MAX_IN_FLIGHT = 4
+MAX_PENDING = 10000
+
+log = get_logger(__name__)
+
+
+class EventGridPublisher:
+    # Collects events into Event Grid array payloads and posts them from a
+    # background thread over a pooled keep-alive session. publish() returns a
+    # Future that resolves to the requests.Response of the batch it went out in.
+    # Posts are retried with backoff on timeouts, throttling and 5xx; each
+    # topic has its own circuit breaker ("eventgrid" settings in
+    # resilient_http).
+
+    def __init__(self, endpoint, key, max_batch_events=MAX_BATCH_EVENTS,
+                 max_batch_bytes=MAX_BATCH_BYTES, max_delay=MAX_DELAY_SECONDS,
+                 max_in_flight=MAX_IN_FLIGHT, max_pending=MAX_PENDING, **client_settings):
+        self.endpoint = endpoint
+        self.max_batch_events = max_batch_events
+        self.max_batch_bytes = max_batch_bytes
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+
+        settings = endpoint_settings("eventgrid")
+        self.client = ResilientClient(
+            "eventgrid",
+            breaker=CircuitBreaker(settings["failure_threshold"], settings["reset_timeout"]),
+            pool_maxsize=max_in_flight,
+            headers={"aeg-sas-key": key, "Content-Type": "application/json"},
+            **client_settings,
+        )
+
+        self._queue = deque()
+        self._queued_bytes = 0
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._slots = threading.Semaphore(max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="eventgrid")
+        self._thread = None
+        self._closed = False
+
+    def publish(self, event):
+        body = dumps(event)
+        future = Future()
+        with self._cond:
+            while len(self._queue) >= self.max_pending and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                raise RuntimeError("Event Grid publisher is closed")
+            self._queue.append((body, future, time.monotonic()))
+            self._queued_bytes += len(body) + 1
+            self._ensure_thread()
+            self._cond.notify_all()
+        return future
+
+    def publish_many(self, events):
+        return [self.publish(event) for event in events]
+
+    def warm(self):
+        # Starts the flusher thread and opens a connection to the topic, so
+        # the first publish does not pay for either
+        with self._cond:
+            self._ensure_thread()
+        self.client.warm(self.endpoint)
+
+    def flush(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._executor.shutdown(wait=True)
+        self.client.close()
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="eventgrid-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            # Waiting for a free slot first lets the next batch keep growing
+            # while all connections are busy.
+            self._slots.acquire()
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    self._slots.release()
+                    return
+                deadline = self._queue[0][2] + self.max_delay
+                while (not self._closed
+                       and len(self._queue) < self.max_batch_events
+                       and self._queued_bytes < self.max_batch_bytes):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take_batch()
+                self._in_flight += 1
+                self._cond.notify_all()
+            self._executor.submit(self._send, batch)
+
+    def _take_batch(self):
+        batch = []
+        size = 2
+        while self._queue and len(batch) < self.max_batch_events:
+            body = self._queue[0][0]
+            if batch and size + len(body) + 1 > self.max_batch_bytes:
+                break
+            _, future, _ = self._queue.popleft()
+            self._queued_bytes -= len(body) + 1
+            size += len(body) + 1
+            batch.append((body, future))
+        return batch
+
+    def _send(self, batch):
+        payload = b"[" + b",".join(body for body, _ in batch) + b"]"
+        try:
+            with timed("eventgrid.publish"):
+                response = self.client.post(self.endpoint, data=payload)
+            increment("eventgrid.events", len(batch))
+            log.debug("Event Grid batch sent", events=len(batch), status=response.status_code)
+            if response.status_code != 200:
+                increment("eventgrid.rejected", len(batch))
+                log.error("Failed to send event batch to Event Grid", status=response.status_code, body=response.text)
+            for _, future in batch:
+                future.set_result(response)
+        except Exception as e:
+            log.error("Error sending event batch to Event Grid", error=str(e))
+            for _, future in batch:
+                future.set_exception(e)
+        finally:
+            self._slots.release()
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+
+_publishers = {}
+_publishers_lock = threading.Lock()
+
+
+def get_publisher(endpoint, key):
+    # One publisher (and connection pool) per topic, shared by every
+    # invocation running in this worker process.
+    with _publishers_lock:
+        publisher = _publishers.get((endpoint, key))
+        if publisher is None:
+            publisher = EventGridPublisher(endpoint, key)
+            _publishers[(endpoint, key)] = publisher
+        return publisher
+
+
+@atexit.register
+def _flush_publishers():
+    for publisher in list(_publishers.values()):
+        publisher.flush(timeout=5)
@@ -0,0 +1,27 @@
+import json
+
+# orjson is several times faster than the standard library on both decode
+# and encode; fall back to json where it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+    JSONDecodeError = orjson.JSONDecodeError
+
+    def loads(data):
+        return orjson.loads(data)
+
+    def dumps(obj):
+        # Compact UTF-8 bytes
+        return orjson.dumps(obj)
+else:
+    JSONDecodeError = json.JSONDecodeError
+
+    def loads(data):
+        return json.loads(data)
+
+    def dumps(obj):
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
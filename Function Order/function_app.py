@@ -1,68 +1,99 @@
+import time
+_load_start = time.perf_counter()
+
+import asyncio
 import azure.functions as func
-import requests
-import json
 import uuid
-import logging
-import time
+import os
+from collections import deque
 from datetime import datetime
+from urllib.parse import urlencode
+
+from dedup import event_keys, get_deduplicator
+from fast_json import JSONDecodeError, dumps, loads
+from geocoding import get_geocode_cache
+from order_schema import parse_order_body
+from order_state import get_order_states
+from order_stream import iter_orders
+from routing import get_route_cache, route_request
+from route_playback import schedule_playback, select_route_points
+from startup import preload, record, report as startup_report, warm_up
+from telemetry import LazyJson, get_logger, increment, instrumented, snapshot, timed
+from travel_matrix import get_travel_time_cache
+from warehouses import get_warehouse_registry
 
 app = func.FunctionApp(http_auth_level=func.AuthLevel.FUNCTION)
+log = get_logger(__name__)
+
+# requests (eventgrid_publisher, resilient_http) and numpy (route_resampling)
+# make up a third of the cold start, so they are imported on first use, or
+# earlier by the warm-up at the end of this module
+def get_publisher(endpoint, key):
+    from eventgrid_publisher import get_publisher as shared_publisher
+    return shared_publisher(endpoint, key)
+
+def get_client(name):
+    from resilient_http import get_client as shared_client
+    return shared_client(name)
+
+# Every outbound endpoint can be overridden from the app settings, e.g. to
+# point the app at benchmarks/fake_azure.py
+ORDER_EVENT_GRID_ENDPOINT = os.environ.get(
+    "ORDER_EVENT_GRID_ENDPOINT", "https://startservice.northeurope-1.eventgrid.azure.net/api/events"
+)
+ORDER_EVENT_GRID_KEY = os.environ.get("ORDER_EVENT_GRID_KEY", "Al2Q+Kw4BgNgwQxefF/07WuCVakzi53orAZEGP3W75s=")
+# Bulk imports stop reading new orders while this many published events
+# are still waiting for their Event Grid batch to be acknowledged
+BULK_MAX_IN_FLIGHT = int(os.environ.get("BULK_MAX_IN_FLIGHT", "1000"))
 
 # HTTP Trigger Function
 @app.function_name(name="http_trigger")
 @app.route(route="http_trigger")
+@instrumented("trigger.http_trigger")
 def http_trigger(req: func.HttpRequest) -> func.HttpResponse:
     try:
-        # Parse request body
-        request_body = req.get_json()
-        print(request_body)
+        order_data, error = parse_order(req)
+        if error is not None:
+            return error
         
-        # Determine the input format
-        if isinstance(request_body, dict) and 'data' in request_body:
-            # Handle the event grid format
-            order_data = request_body['data']
-        else:
-            # Handle the direct order format
-            order_data = request_body
+        event = build_order_event(order_data)
+        response = get_publisher(ORDER_EVENT_GRID_ENDPOINT, ORDER_EVENT_GRID_KEY).publish(event).result()
+        log.debug("Event Grid response", status=response.status_code, body=response.text)
         
-        # Validate request format
-        required_fields = ["order_id", "fieldServiceId", "Material", "delivery_address", "Status"]
-        for field in required_fields:
-            if field not in order_data:
-                return func.HttpResponse(
-                    f"Missing required field: {field}", 
-                    status_code=400
-                )
-        
-        materials = order_data["Material"]
-        if not isinstance(materials, list) or not all(isinstance(item, dict) for item in materials):
+        if response.status_code == 200:
             return func.HttpResponse(
-                "Invalid format for 'Material'.",
-                status_code=400
+                "Order placed successfully!", 
+                status_code=200
             )
+        else:
+            return func.HttpResponse(
+                f"Failed to send event to Event Grid: {response.text}", 
+                status_code=response.status_code
+            )
+    except Exception as e:
+        return func.HttpResponse(
+            f"Internal Server Error: {str(e)}", 
+            status_code=500
+        )
+
+# Async variant: waits on the publisher batch without holding a worker thread
+@app.function_name(name="http_trigger_async")
+@app.route(route="http_trigger_async")
+@instrumented("trigger.http_trigger_async")
+async def http_trigger_async(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        order_data, error = parse_order(req)
+        if error is not None:
+            return error
         
-        print(materials)
-        event_grid_url = "https://startservice.northeurope-1.eventgrid.azure.net/api/events"
-        event = {
-            "id": str(uuid.uuid4()),
-            "eventType": "newOrderReceived",
-            "subject": "NewOrder",
-            "eventTime": datetime.utcnow().isoformat(),
-            "data": {
-                "order_id": order_data["order_id"],
-                "fieldServiceId": order_data["fieldServiceId"],
-                "Material": order_data["Material"],
-                "delivery_address": order_data["delivery_address"],
-                "Status": order_data["Status"],
-                "driverLocation": order_data.get("driverLocation", {})
-            },
-            "dataVersion": "1.0"
-        }
-        headers = {'aeg-sas-key': 'Al2Q+Kw4BgNgwQxefF/07WuCVakzi53orAZEGP3W75s='}
-        response = requests.post(event_grid_url, json=[event], headers=headers)
-        logging.info(response)
-        logging.info(response.text)
-        print(response)
+        # publish() can block (first import, session setup, a full queue),
+        # so it is handed to the default executor rather than run on the loop
+        event = build_order_event(order_data)
+        loop = asyncio.get_running_loop()
+        future = await loop.run_in_executor(
+            None, lambda: get_publisher(ORDER_EVENT_GRID_ENDPOINT, ORDER_EVENT_GRID_KEY).publish(event)
+        )
+        response = await asyncio.wrap_future(future)
         
         if response.status_code == 200:
             return func.HttpResponse(
@@ -80,20 +111,152 @@ def http_trigger(req: func.HttpRequest) -> func.HttpResponse:
             status_code=500
         )
 
+# Bulk import: NDJSON (one order per line) or a JSON array of orders, e.g.
+# the nightly ERP export. Each order is validated like http_trigger and
+# published on its own; the response has one result per line.
+@app.function_name(name="bulk_orders")
+@app.route(route="bulk_orders", methods=["POST"])
+@instrumented("trigger.bulk_orders")
+def bulk_orders(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        publisher = get_publisher(ORDER_EVENT_GRID_ENDPOINT, ORDER_EVENT_GRID_KEY)
+        results = []
+        in_flight = deque()
+        for line, order, error in iter_orders(req.get_body()):
+            result = {"line": line, "status": "accepted"}
+            if isinstance(order, dict) and "order_id" in order:
+                result["order_id"] = order["order_id"]
+            results.append(result)
+            if error is not None:
+                result["status"] = "rejected"
+                result["error"] = error
+                continue
+            in_flight.append((result, publisher.publish(build_order_event(order))))
+            if len(in_flight) >= BULK_MAX_IN_FLIGHT:
+                settle_bulk_result(*in_flight.popleft())
+        while in_flight:
+            settle_bulk_result(*in_flight.popleft())
+
+        if not results:
+            return func.HttpResponse("No orders in request body.", status_code=400)
+        counts = {"accepted": 0, "rejected": 0, "failed": 0}
+        for result in results:
+            counts[result["status"]] += 1
+        for status, count in counts.items():
+            increment(f"bulk.{status}", count)
+        log.info("Bulk import finished", **counts)
+        return func.HttpResponse(dumps(dict(counts, results=results)), status_code=200,
+                                 mimetype="application/json")
+    except Exception as e:
+        # Orders already handed to the publisher may still go out
+        log.error("Bulk import failed", error=str(e))
+        return func.HttpResponse(
+            f"Internal Server Error: {str(e)}", 
+            status_code=500
+        )
+
+def settle_bulk_result(result, future):
+    # Waits for the batch the order went out in and records its outcome
+    try:
+        response = future.result()
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        return
+    if response.status_code != 200:
+        result["status"] = "failed"
+        result["error"] = f"Event Grid returned {response.status_code}"
+
+def parse_order(req):
+    # Returns (order_data, None), or (None, error response) for a bad order.
+    # Malformed orders are rejected before anything else is done with them.
+    order_data, error = parse_order_body(req.get_body())
+    if error is not None:
+        return None, func.HttpResponse(error, status_code=400)
+    log.debug("Order received", order=LazyJson(order_data))
+    return order_data, None
+
+def build_order_event(order_data):
+    return {
+        "id": str(uuid.uuid4()),
+        "eventType": "newOrderReceived",
+        "subject": "NewOrder",
+        "eventTime": datetime.utcnow().isoformat(),
+        "data": {
+            "order_id": order_data["order_id"],
+            "fieldServiceId": order_data["fieldServiceId"],
+            "Material": order_data["Material"],
+            "delivery_address": order_data["delivery_address"],
+            "Status": order_data["Status"],
+            "driverLocation": order_data.get("driverLocation", {})
+        },
+        "dataVersion": "1.0"
+    }
+
 
 
 # Event Grid Trigger Function
-EVENT_GRID_ENDPOINT = "https://fieldagentstatus.northeurope-1.eventgrid.azure.net/api/events"  # Replace with your Event Grid endpoint
-EVENT_GRID_KEY = "nDRGcdiOTV7YdG9lsNM5Q1tK+rtMvc8q4AZEGMkxwRM="  # Replace with your Event Grid key
-AZURE_MAPS_KEY = "CPiS0LsmIo4hpVm9X360A4vwRPreIhUxEsZ7wgrqErIxfKuY8G5xJQQJ99AFACi5YpzxJCnnAAAgAZMPcG7h"
+EVENT_GRID_ENDPOINT = os.environ.get(
+    "STATUS_EVENT_GRID_ENDPOINT", "https://fieldagentstatus.northeurope-1.eventgrid.azure.net/api/events"
+)
+EVENT_GRID_KEY = os.environ.get("STATUS_EVENT_GRID_KEY", "nDRGcdiOTV7YdG9lsNM5Q1tK+rtMvc8q4AZEGMkxwRM=")
+AZURE_MAPS_URL = os.environ.get("AZURE_MAPS_URL", "https://atlas.microsoft.com")
+AZURE_MAPS_KEY = os.environ.get(
+    "AZURE_MAPS_KEY", "CPiS0LsmIo4hpVm9X360A4vwRPreIhUxEsZ7wgrqErIxfKuY8G5xJQQJ99AFACi5YpzxJCnnAAAgAZMPcG7h"
+)
+
+# "blocking" sleeps between points inside the invocation, so a failed send
+# fails it and Event Grid redelivers the event. "scheduled" hands playback to
+# an in-process delay queue and returns right away: it frees the worker, but
+# the queue is not durable. Scale-in, a recycle or a deploy drops every
+# delivery still playing, and failed sends are only logged, as the event
+# that started the playback has been acknowledged already.
+ROUTE_PLAYBACK_MODE = os.environ.get("ROUTE_PLAYBACK_MODE", "blocking")
+ROUTE_UPDATE_INTERVAL = float(os.environ.get("ROUTE_UPDATE_INTERVAL", "10"))
+# Positions sent per delivery (start and destination included), how they are
+# spread ("distance", "time" or "index"), and an optional Douglas-Peucker
+# tolerance in meters applied before resampling
+ROUTE_UPDATE_SAMPLES = int(os.environ.get("ROUTE_UPDATE_SAMPLES", "10"))
+ROUTE_RESAMPLE_MODE = os.environ.get("ROUTE_RESAMPLE_MODE", "distance")
+ROUTE_SIMPLIFY_TOLERANCE = float(os.environ.get("ROUTE_SIMPLIFY_TOLERANCE", "0"))
+# "compact" sends the order data once (send_initial_route_data) and then
+# small DriverLocation events with just the order id, a sequence number and
+# the position; "full" repeats the whole order in every SendingCoordinates
+# update. Compact positions are either "absolute" or "delta" encoded, the
+# latter in micro-degrees against the previous update with an absolute
+# keyframe every ROUTE_KEYFRAME_INTERVAL updates. Delta saves only a few
+# bytes per event and consumers drop deltas that arrive out of order or
+# after a retried batch until the next keyframe, so it is opt-in.
+ROUTE_UPDATE_FORMAT = os.environ.get("ROUTE_UPDATE_FORMAT", "compact")
+ROUTE_UPDATE_ENCODING = os.environ.get("ROUTE_UPDATE_ENCODING", "absolute")
+ROUTE_KEYFRAME_INTERVAL = int(os.environ.get("ROUTE_KEYFRAME_INTERVAL", "5"))
+MICRODEGREES = 1000000
+# Batch geocoding takes up to 100 addresses per call; long-running batch
+# requests are polled until done
+GEOCODE_BATCH_SIZE = 100
+MAPS_POLL_INTERVAL = 1.0
+MAPS_POLL_TIMEOUT = 120
 
 
 @app.function_name(name="fieldservice_event_grid")
 @app.event_grid_trigger(arg_name="event")
+@instrumented("trigger.event_grid_trigger")
 def event_grid_trigger(event: func.EventGridEvent):
-    logging.info("Event received")
-    
     event_data = event.get_json()
+    # Event Grid delivers at least once; drop repeats before any Maps call or
+    # route playback
+    keys = event_keys(event.id, event_data.get('order_id'), event_data.get('Status'))
+    if not get_deduplicator().claim(keys):
+        increment("dedup.skipped.event_grid_trigger")
+        log.info("Duplicate event skipped", id=event.id, order_id=event_data.get('order_id'))
+        return
+    try:
+        process_status_event(event_data)
+    except Exception:
+        get_deduplicator().forget(keys)
+        raise
+
+def process_status_event(event_data):
     order_id = event_data.get('order_id')
     field_service_id = event_data.get('fieldServiceId')
     materials = event_data.get('Material', [])
@@ -101,12 +264,8 @@ def event_grid_trigger(event: func.EventGridEvent):
     status = event_data.get('Status')
     driver_location = event_data.get('driverLocation', {})
 
-    logging.info(f"Order ID: {order_id}")
-    logging.info(f"Field Service ID: {field_service_id}")
-    logging.info(f"Materials: {materials}")
-    logging.info(f"Delivery Address: {delivery_address}")
-    logging.info(f"Status: {status}")
-    logging.info(f"Driver Location: {driver_location}")
+    log.info("Event received", order_id=order_id, fieldServiceId=field_service_id, status=status)
+    log.debug("Event data", data=LazyJson(event_data))
 
     if status == "pending_warehouse":
         event = {
@@ -126,34 +285,56 @@ def event_grid_trigger(event: func.EventGridEvent):
         }
         send_to_event_grid(event)
     else:
-        warehouse_coords = (39.91344, -8.43924)
-        delivery_coords = get_coordinates_from_address(delivery_address)
+        try:
+            delivery_coords = get_coordinates_from_address(delivery_address)
+        except ValueError as e:
+            # Retrying will not find it either
+            log.error("Delivery address not found", order_id=order_id, error=str(e))
+            return
+        warehouse = select_warehouse(delivery_coords, materials)
+        if warehouse is None:
+            log.error("No warehouse registered", order_id=order_id)
+            return
+        warehouse_coords = warehouse.coordinates()
         
-        logging.info(f"Warehouse coordinates: {warehouse_coords}")
-        logging.info(f"Delivery coordinates: {delivery_coords}")
+        log.debug("Coordinates", warehouse=warehouse.warehouse_id, start=warehouse_coords,
+                  delivery=delivery_coords)
         
-        route_points = calculate_route(warehouse_coords, delivery_coords)
+        route = get_route(warehouse_coords, delivery_coords)
         
-        if route_points:
-            logging.info(f"Route calculated. Total points: {len(route_points)}")
-            logging.info(f"First point: {route_points[0]}")
-            logging.info(f"Last point: {route_points[-1]}")
+        if route:
+            log.debug("Route calculated", order_id=order_id, points=len(route))
             
             send_initial_route_data(order_id, field_service_id, materials, delivery_address, 
                                     warehouse_coords, delivery_coords)
             
-            send_route_updates(order_id, field_service_id, materials, delivery_address, route_points)
-            logging.info(f"Route updates completed for order {order_id}")
+            send_route_updates(order_id, field_service_id, materials, delivery_address, route)
+            log.info("Route playback started", order_id=order_id)
         else:
-            logging.error("Failed to calculate route")
-def calculate_route(start, end):
-    url = f"https://atlas.microsoft.com/route/directions/json?api-version=1.0&subscription-key={AZURE_MAPS_KEY}&query={start[0]},{start[1]}:{end[0]},{end[1]}"
-    response = requests.get(url)
-    route_info = response.json()
-    
-    if 'routes' in route_info and len(route_info['routes']) > 0:
-        return route_info['routes'][0]['legs'][0]['points']
-    return None
+            log.error("Failed to calculate route", order_id=order_id)
+def select_warehouse(delivery_coords, materials):
+    # Nearest depot that can fill the whole order, or the nearest one at all
+    # when none of them can
+    filling, closest = get_warehouse_registry().nearest_with_fallback(
+        delivery_coords[0], delivery_coords[1], materials
+    )
+    if filling is None:
+        log.warning("No warehouse can fill the order", delivery=delivery_coords)
+        filling = closest
+    return filling[1] if filling else None
+
+def get_route(start, end):
+    # One route/directions call gives both the geometry and the summary
+    return get_route_cache().get_or_fetch(start, end, fetch_route)
+
+def fetch_route(start, end):
+    url, params = route_request(AZURE_MAPS_URL, start, end, AZURE_MAPS_KEY)
+    with timed("maps.route"):
+        response = get_client("maps").get(url, params=params)
+    if response.status_code != 200:
+        raise Exception(f"Error calling Azure Maps Route API: {response.status_code}")
+    return response.json()
+
 def send_initial_route_data(order_id, field_service_id, materials, delivery_address, start, end):
     event = {
         "id": str(uuid.uuid4()),
@@ -183,85 +364,332 @@ def send_initial_route_data(order_id, field_service_id, materials, delivery_addr
     send_to_event_grid(event)
 
 def send_route_updates(order_id, field_service_id, materials, delivery_address, route_points):
-    total_points = len(route_points)
-    num_points_to_send = 9  # We'll send 9 intermediate points + the destination
-    
-    logging.info(f"Total route points: {total_points}")
-    logging.info(f"Start point: {route_points[0]}")
-    logging.info(f"End point: {route_points[-1]}")
+    # route_points is a routing.Route or a list of {"latitude", "longitude"}
+    from route_resampling import route_array
+    coords = route_array(route_points)
     
-    # Calculate the step size to evenly distribute points
-    step = max(1, (total_points - 1) // num_points_to_send)
+    samples = sample_route(coords, getattr(route_points, "travel_time_seconds", None),
+                           getattr(route_points, "time_marks", None))
+    points_to_send = [{"latitude": float(lat), "longitude": float(lon)} for lat, lon in samples]
+    log.debug("Route sampled", order_id=order_id, route_points=len(coords), samples=len(points_to_send))
     
-    points_to_send = [
-        (i, route_points[i]) 
-        for i in range(0, total_points - 1, step)
-    ][:num_points_to_send]
-    
-    # Add the destination point
-    points_to_send.append((total_points - 1, route_points[-1]))
-    
-    logging.info(f"Points to send: {points_to_send}")
-    
-    start_point = route_points[0]
-    end_point = route_points[-1]
+    end_point = points_to_send[-1]
+    if ROUTE_UPDATE_FORMAT == "compact":
+        updates = location_updates(order_id, samples)
 
-    for index, point in points_to_send:
-        is_last_point = (index == total_points - 1)
-        
-        event = {
-            "id": str(uuid.uuid4()),
-            "eventType": "SendingCoordinates",
-            "subject": "RouteUpdate",
-            "eventTime": datetime.utcnow().isoformat(),
-            "data": {
-                "order_id": order_id,
-                "fieldServiceId": field_service_id,
-                "Material": materials,
-                "delivery_address": delivery_address,
-                "Status": "Delivering_Order",
-                "driverLocation": {
-                    "currentLocation": {
-                        "latitude": str(point['latitude']),
-                        "longitude": str(point['longitude'])
-                    },
-                    "destination": {
-                        "latitude": str(end_point['latitude']),
-                        "longitude": str(end_point['longitude'])
-                    },
-                    "eventType": "RouteData",
-                },
-            },
-            "dataVersion": "1.0"
-        }
-        
-        logging.info(f"Sending event for point {index + 1}/{len(points_to_send)}:")
-        logging.info(f"Current location: {point}")
-        logging.info(f"Destination: {end_point}")
-        logging.info(f"Event data: {json.dumps(event, indent=2)}")
+    def send_point(step):
+        position, point = step
+        is_last_point = (position == len(points_to_send) - 1)
+        if ROUTE_UPDATE_FORMAT == "compact":
+            event = build_location_event(updates[position])
+        else:
+            event = build_route_update_event(order_id, field_service_id, materials, delivery_address,
+                                             point, end_point)
         
-        send_to_event_grid(event)
+        log.debug("Sending coordinate", order_id=order_id, position=position + 1,
+                  total=len(points_to_send), event=LazyJson(event))
         
-        logging.info(f"Sent coordinate {index + 1} of {len(points_to_send)} for order {order_id}")
+        if ROUTE_PLAYBACK_MODE == "blocking":
+            send_to_event_grid(event)
+        else:
+            queue_to_event_grid(event).add_done_callback(
+                lambda future: check_scheduled_send(order_id, position, future))
         
         if is_last_point:
-            logging.info(f"Last coordinate (destination) sent for order {order_id}. Ending function.")
-            return  # Exit the function after sending the last coordinate
-        
-        time.sleep(10)  # Wait 10 seconds between each coordinate
+            log.info("Last coordinate (destination) sent", order_id=order_id)
+
+    steps = list(enumerate(points_to_send))
+    if ROUTE_PLAYBACK_MODE == "blocking":
+        for step in steps:
+            if step[0] > 0:
+                time.sleep(ROUTE_UPDATE_INTERVAL)  # Wait between each coordinate
+            send_point(step)
+        log.info("All selected coordinates sent", order_id=order_id)
+    else:
+        # Hand the timing to the playback scheduler and release the invocation
+        schedule_playback(steps, send_point, ROUTE_UPDATE_INTERVAL)
+        log.debug("Coordinates scheduled", order_id=order_id, count=len(steps))
+
+def check_scheduled_send(order_id, position, future):
+    # Nobody waits on scheduled sends, so at least make failures visible
+    try:
+        status = future.result().status_code
+    except Exception as e:
+        status = None
+        error = str(e)
+    else:
+        error = None
+    if status != 200:
+        increment("playback.failed")
+        log.error("Scheduled route update not sent", order_id=order_id, position=position + 1,
+                  status=status, error=error)
+
+def sample_route(coords, travel_time_seconds=None, time_marks=None):
+    # ROUTE_UPDATE_SAMPLES positions from start to destination, evenly spaced
+    # by distance (default), by driving time, or by point index (legacy)
+    import numpy as np
+    from route_resampling import point_times, resample_by_distance, resample_by_time, simplify_mask
+    times = None
+    if ROUTE_RESAMPLE_MODE == "time":
+        times = point_times(coords, travel_time_seconds, time_marks)
+    if ROUTE_SIMPLIFY_TOLERANCE > 0:
+        keep = simplify_mask(coords, ROUTE_SIMPLIFY_TOLERANCE)
+        coords = coords[keep]
+        if times is not None:
+            times = times[keep]
+    if times is not None:
+        return resample_by_time(coords, times, ROUTE_UPDATE_SAMPLES)
+    if ROUTE_RESAMPLE_MODE == "index":
+        return np.array([point for _, point in select_route_points(coords, ROUTE_UPDATE_SAMPLES - 1)])
+    return resample_by_distance(coords, ROUTE_UPDATE_SAMPLES)
+
+def build_route_update_event(order_id, field_service_id, materials, delivery_address, point, end_point):
+    return {
+        "id": str(uuid.uuid4()),
+        "eventType": "SendingCoordinates",
+        "subject": "RouteUpdate",
+        "eventTime": datetime.utcnow().isoformat(),
+        "data": {
+            "order_id": order_id,
+            "fieldServiceId": field_service_id,
+            "Material": materials,
+            "delivery_address": delivery_address,
+            "Status": "Delivering_Order",
+            "driverLocation": {
+                "currentLocation": {
+                    "latitude": str(point['latitude']),
+                    "longitude": str(point['longitude'])
+                },
+                "destination": {
+                    "latitude": str(end_point['latitude']),
+                    "longitude": str(end_point['longitude'])
+                },
+                "eventType": "RouteData",
+            },
+        },
+        "dataVersion": "1.0"
+    }
+
+def location_updates(order_id, samples, encoding=None, keyframe_interval=None):
+    # DriverLocation payloads for the sampled positions, seq starting at 1.
+    # Positions are quantized to micro-degrees (~11 cm) first so deltas add
+    # up exactly to the next keyframe.
+    encoding = encoding or ROUTE_UPDATE_ENCODING
+    keyframe_interval = keyframe_interval or ROUTE_KEYFRAME_INTERVAL
+    import numpy as np
+    quantized = np.rint(np.asarray(samples, dtype=np.float64) * MICRODEGREES).astype(np.int64).tolist()
+    updates = []
+    for position, (lat, lon) in enumerate(quantized):
+        update = {"order_id": order_id, "seq": position + 1}
+        if encoding == "delta" and position % keyframe_interval:
+            previous = quantized[position - 1]
+            update["dlat"] = lat - previous[0]
+            update["dlon"] = lon - previous[1]
+        else:
+            update["lat"] = lat / MICRODEGREES
+            update["lon"] = lon / MICRODEGREES
+        updates.append(update)
+    return updates
+
+def build_location_event(update):
+    return {
+        "id": str(uuid.uuid4()),
+        "eventType": "DriverLocation",
+        "subject": "RouteUpdate",
+        "eventTime": datetime.utcnow().isoformat(),
+        "data": update,
+        "dataVersion": "2.0"
+    }
 
-    logging.info(f"All selected coordinates sent for order {order_id}. Ending function.")
-    
 def send_to_event_grid(event):
-    headers = {'aeg-sas-key': EVENT_GRID_KEY}
-    response = requests.post(EVENT_GRID_ENDPOINT, json=[event], headers=headers)
-    logging.info(f"Event Grid Response: {response.status_code}")
+    # Raises when the event could not be delivered, so the invocation fails
+    # and Event Grid redelivers the event that caused it
+    response = queue_to_event_grid(event).result()
+    log.debug("Event Grid response", status=response.status_code)
     if response.status_code != 200:
-        logging.error(f"Failed to send event to Event Grid: {response.text}")
+        log.error("Failed to send event to Event Grid", status=response.status_code, body=response.text)
+        raise RuntimeError(f"Event Grid returned {response.status_code}")
+
+def queue_to_event_grid(event):
+    # Does not wait for the post; the publisher logs failed batches
+    return get_publisher(EVENT_GRID_ENDPOINT, EVENT_GRID_KEY).publish(event)
 
 def get_coordinates_from_address(address):
-    search_url = f"https://atlas.microsoft.com/search/address/json?api-version=1.0&subscription-key={AZURE_MAPS_KEY}&query={address}"
-    response = requests.get(search_url)
-    search_results = response.json()
-    coordinates = search_results['results'][0]['position']
-    return (coordinates['lat'], coordinates['lon'])
\ No newline at end of file
+    return get_geocode_cache().get_or_lookup(address, search_address)
+
+def search_address(address):
+    search_url = f"{AZURE_MAPS_URL}/search/address/json?api-version=1.0&subscription-key={AZURE_MAPS_KEY}&query={address}"
+    with timed("maps.geocode"):
+        response = get_client("maps").get(search_url)
+    if response.status_code != 200:
+        raise Exception(f"Error calling Azure Maps Geocoding API: {response.status_code}")
+    search_results = response.json().get('results')
+    if not search_results:
+        raise ValueError(f"Address not found: {address}")
+    coordinates = search_results[0]['position']
+    return (coordinates['lat'], coordinates['lon'])
+
+def search_addresses(addresses):
+    # Coordinates (or None when not found) for each address, in order
+    coordinates = []
+    for i in range(0, len(addresses), GEOCODE_BATCH_SIZE):
+        chunk = addresses[i:i + GEOCODE_BATCH_SIZE]
+        batch = {"batchItems": [{"query": "?" + urlencode({"query": address, "limit": 1})} for address in chunk]}
+        with timed("maps.geocode_batch"):
+            result = post_maps("/search/address/batch/sync/json", batch)
+        for item in result.get("batchItems", []):
+            results = item.get("response", {}).get("results") if item.get("statusCode") == 200 else None
+            if results:
+                position = results[0]["position"]
+                coordinates.append((position["lat"], position["lon"]))
+            else:
+                coordinates.append(None)
+    return coordinates
+
+def fetch_route_matrix(origins, destinations):
+    # Raw Route Matrix JSON for every origin x destination pair
+    body = {
+        "origins": {"type": "MultiPoint", "coordinates": [[lon, lat] for lat, lon in origins]},
+        "destinations": {"type": "MultiPoint", "coordinates": [[lon, lat] for lat, lon in destinations]},
+    }
+    with timed("maps.route_matrix"):
+        return post_maps("/route/matrix/json", body, waitForResults="true")
+
+def post_maps(path, body, **params):
+    # Azure Maps batch APIs answer 202 with a Location to poll when the
+    # result is not ready within the request
+    client = get_client("maps")
+    params = {"api-version": "1.0", "subscription-key": AZURE_MAPS_KEY, **params}
+    response = client.post(f"{AZURE_MAPS_URL}{path}", params=params, data=dumps(body),
+                           headers={"Content-Type": "application/json"})
+    deadline = time.monotonic() + MAPS_POLL_TIMEOUT
+    while response.status_code == 202 and time.monotonic() < deadline:
+        time.sleep(MAPS_POLL_INTERVAL)
+        response = client.get(response.headers["Location"], params={"subscription-key": AZURE_MAPS_KEY})
+    response.raise_for_status()
+    return response.json()
+
+# ETA planning: {"orders": [{"order_id", "delivery_address"}, ...],
+# "warehouses": [warehouse ids, optional]} -> depots x destinations travel
+# times in seconds, from one batched geocode and matrix pass
+@app.function_name(name="travel_time_matrix")
+@app.route(route="travel_time_matrix", methods=["POST"])
+@instrumented("trigger.travel_time_matrix")
+def travel_time_matrix(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        body = loads(req.get_body())
+    except (JSONDecodeError, ValueError):
+        return func.HttpResponse("Invalid JSON body.", status_code=400)
+    orders = body.get("orders") if isinstance(body, dict) else body
+    if not isinstance(orders, list) or not orders:
+        return func.HttpResponse("Expected a non-empty list of orders.", status_code=400)
+    for order in orders:
+        if not isinstance(order, dict) or not isinstance(order.get("delivery_address"), str) \
+                or not order["delivery_address"].strip():
+            return func.HttpResponse("Every order needs a delivery_address.", status_code=400)
+
+    wanted = body.get("warehouses") if isinstance(body, dict) else None
+    if wanted is not None and (not isinstance(wanted, list)
+                               or not all(isinstance(warehouse_id, str) for warehouse_id in wanted)):
+        return func.HttpResponse("warehouses must be a list of warehouse ids.", status_code=400)
+
+    depots = get_warehouse_registry().warehouses()
+    if wanted:
+        wanted = set(wanted)
+        depots = [warehouse for warehouse in depots if warehouse.warehouse_id in wanted]
+    if not depots:
+        return func.HttpResponse("No matching warehouses.", status_code=404)
+
+    try:
+        coordinates = get_geocode_cache().get_or_lookup_many(
+            [order["delivery_address"] for order in orders], search_addresses
+        )
+        resolved = [order for order in orders if coordinates[order["delivery_address"]] is not None]
+        table = get_travel_time_cache().matrix(
+            [warehouse.coordinates() for warehouse in depots],
+            [coordinates[order["delivery_address"]] for order in resolved],
+            fetch_route_matrix,
+        )
+    except Exception as e:
+        log.error("Travel time matrix failed", error=str(e))
+        return func.HttpResponse(f"Error calling Azure Maps: {str(e)}", status_code=502)
+
+    result = {
+        "depots": [
+            {"warehouse_id": warehouse.warehouse_id, "latitude": warehouse.lat, "longitude": warehouse.lon}
+            for warehouse in depots
+        ],
+        "destinations": [
+            {
+                "order_id": order.get("order_id"),
+                "delivery_address": order["delivery_address"],
+                "latitude": coordinates[order["delivery_address"]][0],
+                "longitude": coordinates[order["delivery_address"]][1],
+            }
+            for order in resolved
+        ],
+        "travel_time_seconds": table,
+        "unresolved": [order.get("order_id") for order in orders if coordinates[order["delivery_address"]] is None],
+    }
+    return func.HttpResponse(dumps(result), status_code=200, mimetype="application/json")
+
+# Order-state read model. Subscribe this function to the order, status and
+# warehouse topics; every event it sees updates the order's current state.
+@app.function_name(name="order_state")
+@app.event_grid_trigger(arg_name="event")
+@instrumented("trigger.order_state")
+def order_state(event: func.EventGridEvent):
+    get_order_states().apply(event.event_type, event.get_json(), event.event_time)
+
+# GET orders?order_id=... for one order, or orders?fieldServiceId=...&status=...
+# (either or both, or neither for all orders) for a page of them; pass the
+# returned next_cursor as cursor for the next page
+@app.function_name(name="orders")
+@app.route(route="orders", methods=["GET"])
+@instrumented("trigger.orders")
+def orders(req: func.HttpRequest) -> func.HttpResponse:
+    store = get_order_states()
+    order_id = req.params.get("order_id")
+    if order_id is not None:
+        state = store.get(order_id)
+        if state is None:
+            return func.HttpResponse("Order not found.", status_code=404)
+        return func.HttpResponse(dumps(state), status_code=200, mimetype="application/json")
+
+    try:
+        cursor = int(req.params.get("cursor", "0"))
+        limit = int(req.params.get("limit", "0"))
+    except ValueError:
+        return func.HttpResponse("cursor and limit must be integers.", status_code=400)
+    if cursor < 0 or limit < 0:
+        return func.HttpResponse("cursor and limit must not be negative.", status_code=400)
+    page, next_cursor = store.query(req.params.get("fieldServiceId"), req.params.get("status"), cursor, limit)
+    return func.HttpResponse(dumps({"orders": page, "next_cursor": next_cursor}), status_code=200,
+                             mimetype="application/json")
+
+@app.function_name(name="metrics")
+@app.route(route="metrics", methods=["GET"])
+def metrics(req: func.HttpRequest) -> func.HttpResponse:
+    body = snapshot()
+    body["caches"] = {
+        "geocode": get_geocode_cache().stats(),
+        "route": get_route_cache().stats(),
+        "travel_time": get_travel_time_cache().stats(),
+    }
+    body["dedup"] = get_deduplicator().stats()
+    body["order_state"] = get_order_states().stats()
+    body["startup"] = startup_report()
+    return func.HttpResponse(dumps(body), status_code=200, mimetype="application/json")
+
+def warm_up_steps():
+    return [
+        ("imports", lambda: preload("resilient_http", "eventgrid_publisher", "numpy", "route_resampling")),
+        ("caches", lambda: (get_geocode_cache(), get_route_cache(), get_travel_time_cache(),
+                            get_warehouse_registry(), get_deduplicator(), get_order_states())),
+        ("eventgrid", lambda: [get_publisher(endpoint, key).warm() for endpoint, key in
+                               ((ORDER_EVENT_GRID_ENDPOINT, ORDER_EVENT_GRID_KEY), (EVENT_GRID_ENDPOINT, EVENT_GRID_KEY))]),
+        ("maps", lambda: get_client("maps").warm(AZURE_MAPS_URL)),
+    ]
+
+record("load.function_app", time.perf_counter() - _load_start)
+warm_up(warm_up_steps())
@@ -0,0 +1,156 @@
+import asyncio
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+GEOCODE_CACHE_SIZE = int(os.environ.get("GEOCODE_CACHE_SIZE", "4096"))
+GEOCODE_CACHE_TTL = float(os.environ.get("GEOCODE_CACHE_TTL", str(30 * 24 * 3600)))
+GEOCODE_CACHE_PATH = os.environ.get(
+    "GEOCODE_CACHE_PATH", os.path.join(tempfile.gettempdir(), "geocode_cache.sqlite3")
+)
+
+_WHITESPACE = re.compile(r"\s+")
+_SEPARATORS = re.compile(r"\s*([,;])\s*")
+
+
+def normalize_address(address):
+    # "  Rua  Direita 1 ,Coimbra " and "rua direita 1, coimbra" share an entry
+    address = unicodedata.normalize("NFKC", str(address)).casefold()
+    address = _SEPARATORS.sub(r"\1 ", address)
+    address = _WHITESPACE.sub(" ", address)
+    return address.strip(" ,;.")
+
+
+class GeocodeCache:
+    # Two tiers: an in-memory LRU with TTL in front of an SQLite file on local
+    # disk that survives restarts of the worker. Only successful lookups are
+    # cached.
+
+    def __init__(self, max_entries=GEOCODE_CACHE_SIZE, ttl=GEOCODE_CACHE_TTL, path=GEOCODE_CACHE_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS geocode "
+                "(address TEXT PRIMARY KEY, lat REAL, lon REAL, expires REAL)"
+            )
+            self._db.commit()
+
+    def get(self, address, disk=True):
+        # disk=False only looks in memory and does not count a miss
+        key = normalize_address(address)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[0]
+                del self._entries[key]
+            if not disk:
+                return None
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT lat, lon, expires FROM geocode WHERE address = ?", (key,)
+                ).fetchone()
+                if row is not None and row[2] > now:
+                    coordinates = (row[0], row[1])
+                    self._remember(key, coordinates, row[2])
+                    self.disk_hits += 1
+                    return coordinates
+            self.misses += 1
+            return None
+
+    def put(self, address, coordinates):
+        key = normalize_address(address)
+        expires = time.time() + self.ttl
+        coordinates = (float(coordinates[0]), float(coordinates[1]))
+        with self._lock:
+            self._remember(key, coordinates, expires)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO geocode (address, lat, lon, expires) VALUES (?, ?, ?, ?)",
+                    (key, coordinates[0], coordinates[1], expires),
+                )
+                self._db.commit()
+
+    def get_or_lookup(self, address, lookup):
+        coordinates = self.get(address)
+        if coordinates is None:
+            coordinates = lookup(address)
+            self.put(address, coordinates)
+        return coordinates
+
+    def get_or_lookup_many(self, addresses, lookup_many):
+        # {address: coordinates or None}. lookup_many(addresses) geocodes the
+        # misses in one go and returns coordinates (or None) in order.
+        results = {}
+        for address in addresses:
+            if address not in results:
+                results[address] = self.get(address)
+        missing = [address for address, coordinates in results.items() if coordinates is None]
+        if missing:
+            for address, coordinates in zip(missing, lookup_many(missing)):
+                if coordinates is not None:
+                    self.put(address, coordinates)
+                    results[address] = coordinates
+        return results
+
+    async def get_or_lookup_async(self, address, lookup):
+        # Same as get_or_lookup with a coroutine lookup. Only the memory tier
+        # is read on the event loop; SQLite runs on the default executor.
+        coordinates = self.get(address, disk=False)
+        if coordinates is not None:
+            return coordinates
+        loop = asyncio.get_running_loop()
+        if self._db is not None:
+            coordinates = await loop.run_in_executor(None, self.get, address)
+        else:
+            coordinates = self.get(address)
+        if coordinates is None:
+            coordinates = await lookup(address)
+            if self._db is not None:
+                await loop.run_in_executor(None, self.put, address, coordinates)
+            else:
+                self.put(address, coordinates)
+        return coordinates
+
+    def stats(self):
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+            }
+
+    def _remember(self, key, coordinates, expires):
+        self._entries[key] = (coordinates, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_geocode_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = GeocodeCache()
+        return _cache
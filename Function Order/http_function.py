@@ -1,53 +1,52 @@
+import asyncio
 import azure.functions as func
-import requests
 import json
+import os
 import uuid
 from datetime import datetime
 from . import app  # Import the app instance from __init__.py
+from .geocoding import get_geocode_cache
+from .order_schema import parse_order_body
+from .routing import get_route_cache, route_request
+from .telemetry import LazyJson, get_logger, instrumented, timed
+from .warehouses import get_warehouse_registry
+
+EVENT_GRID_ENDPOINT = os.environ.get(
+    "VISABEIRA_EVENT_GRID_ENDPOINT", "https://visabeiragrid.northeurope-1.eventgrid.azure.net/api/events"
+)
+EVENT_GRID_KEY = os.environ.get("VISABEIRA_EVENT_GRID_KEY", "79p4fG7wQAJlltOwJhNDKLrItzkJUWfXLAZEGAGv9Po=")
+AZURE_MAPS_URL = os.environ.get("AZURE_MAPS_URL", "https://atlas.microsoft.com")
+AZURE_MAPS_KEY = os.environ.get(
+    "AZURE_MAPS_KEY", "CPiS0LsmIo4hpVm9X360A4vwRPreIhUxEsZ7wgrqErIxfKuY8G5xJQQJ99AFACi5YpzxJCnnAAAgAZMPcG7h"
+)
+
+log = get_logger(__name__)
+
+# aiohttp and requests are imported on first use rather than with the app
+async def get_json(url, params=None):
+    from .async_http import get_json as shared_get_json
+    return await shared_get_json(url, params)
+
+def get_publisher(endpoint, key):
+    from .eventgrid_publisher import get_publisher as shared_publisher
+    return shared_publisher(endpoint, key)
+
+def get_client(name):
+    from .resilient_http import get_client as shared_client
+    return shared_client(name)
 
 @app.function_name(name="http_trigger")
 @app.route(route="http_trigger")
+@instrumented("trigger.http_trigger")
 def main(req: func.HttpRequest) -> func.HttpResponse:
     try:
-        # Parse request body
-        request_body = req.get_json()
-        print(request_body)
-        
-        # Determine the input format
-        if isinstance(request_body, dict) and 'data' in request_body:
-            # Handle the event grid format
-            order_data = request_body['data']
-        else:
-            # Handle the direct order format
-            order_data = request_body
-        
-        # Validate request format
-        required_fields = ["order_id", "fieldServiceId", "Material", "delivery_address", "Status"]
-        for field in required_fields:
-            if field not in order_data:
-                return func.HttpResponse(
-                    f"Missing required field: {field}", 
-                    status_code=400
-                )
-        
-        materials = order_data["Material"]
-        if not isinstance(materials, list) or not all(isinstance(item, dict) for item in materials):
-            return func.HttpResponse(
-                "Invalid format for 'Material'. It should be a list of dictionaries.",
-                status_code=400
-            )
-        
-        print(materials)
-        
-        # Warehouse location (fixed)
-        warehouse_lat = 34.052235
-        warehouse_lon = -118.243683
-        
+        order_data, error = parse_order(req)
+        if error is not None:
+            return error
         # Check status and handle accordingly
         if order_data["Status"] == "ready_to_pickup":
             delivery_address = order_data["delivery_address"]
-            print(delivery_address)
-            azure_maps_key = "CPiS0LsmIo4hpVm9X360A4vwRPreIhUxEsZ7wgrqErIxfKuY8G5xJQQJ99AFACi5YpzxJCnnAAAgAZMPcG7h"
+            azure_maps_key = AZURE_MAPS_KEY
             try:
                 delivery_lat, delivery_lon = get_location(delivery_address, azure_maps_key)
             except ValueError as e:
@@ -55,11 +54,10 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             except Exception as e:
                 return func.HttpResponse(str(e), status_code=500)
             
+            warehouse_lat, warehouse_lon = warehouse_location(delivery_lat, delivery_lon, order_data["Material"])
+            
             # Calculate travel time using Azure Maps Route API
             try:
-                print(delivery_lat)
-                print(delivery_lon)
-                
                 travel_time = calculate_travel_time(
                     warehouse_lat=warehouse_lat,
                     warehouse_lon=warehouse_lon,
@@ -67,7 +65,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                     delivery_lon=delivery_lon,
                     azure_maps_key=azure_maps_key
                 )
-                print(travel_time)
+                log.debug("Travel time", order_id=order_data["order_id"], minutes=travel_time)
                 return func.HttpResponse(
                     f"Estimated travel time to delivery address: {travel_time} minutes", 
                     status_code=200
@@ -76,25 +74,66 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 return func.HttpResponse(f"Error calculating travel time: {str(e)}", status_code=500)
         
         # For other statuses, send the order data to the Event Grid topic
-        event_grid_url = "https://visabeiragrid.northeurope-1.eventgrid.azure.net/api/events"
-        event = {
-            "id": str(uuid.uuid4()),
-            "eventType": "newOrderReceived",
-            "subject": "NewOrder",
-            "eventTime": datetime.utcnow().isoformat(),
-            "data": {
-                "order_id": order_data["order_id"],
-                "fieldServiceId": order_data["fieldServiceId"],
-                "Material": order_data["Material"],
-                "delivery_address": order_data["delivery_address"],
-                "Status": order_data["Status"],
-                "driverLocation": order_data.get("driverLocation", {})
-            },
-            "dataVersion": "1.0"
-        }
-        headers = {'aeg-sas-key': '79p4fG7wQAJlltOwJhNDKLrItzkJUWfXLAZEGAGv9Po='}
-        response = requests.post(event_grid_url, json=[event], headers=headers)
-        print(response)
+        event = build_order_event(order_data)
+        response = get_publisher(EVENT_GRID_ENDPOINT, EVENT_GRID_KEY).publish(event).result()
+        log.debug("Event Grid response", status=response.status_code)
+        
+        if response.status_code == 200:
+            return func.HttpResponse(
+                "Order placed successfully!", 
+                status_code=200
+            )
+        else:
+            return func.HttpResponse(
+                f"Failed to send event to Event Grid: {response.text}", 
+                status_code=response.status_code
+            )
+    except Exception as e:
+        return func.HttpResponse(
+            f"Internal Server Error: {str(e)}", 
+            status_code=500
+        )
+
+# Async variant of the endpoint above. Outbound calls go through a shared
+# aiohttp pool and the publisher's batches, so a worker can keep many orders
+# in flight instead of parking a thread on each blocking request.
+@app.function_name(name="http_trigger_async")
+@app.route(route="http_trigger_async")
+@instrumented("trigger.http_trigger_async")
+async def main_async(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        order_data, error = parse_order(req)
+        if error is not None:
+            return error
+        
+        if order_data["Status"] == "ready_to_pickup":
+            try:
+                delivery_lat, delivery_lon = await get_location_async(order_data["delivery_address"], AZURE_MAPS_KEY)
+            except ValueError as e:
+                return func.HttpResponse(str(e), status_code=404)
+            except Exception as e:
+                return func.HttpResponse(str(e), status_code=500)
+            warehouse_lat, warehouse_lon = warehouse_location(delivery_lat, delivery_lon, order_data["Material"])
+            
+            try:
+                travel_time = await calculate_travel_time_async(
+                    warehouse_lat, warehouse_lon, delivery_lat, delivery_lon, AZURE_MAPS_KEY
+                )
+                return func.HttpResponse(
+                    f"Estimated travel time to delivery address: {travel_time} minutes", 
+                    status_code=200
+                )
+            except Exception as e:
+                return func.HttpResponse(f"Error calculating travel time: {str(e)}", status_code=500)
+        
+        # publish() can block (first import, session setup, a full queue),
+        # so it is handed to the default executor rather than run on the loop
+        event = build_order_event(order_data)
+        loop = asyncio.get_running_loop()
+        future = await loop.run_in_executor(
+            None, lambda: get_publisher(EVENT_GRID_ENDPOINT, EVENT_GRID_KEY).publish(event)
+        )
+        response = await asyncio.wrap_future(future)
         
         if response.status_code == 200:
             return func.HttpResponse(
@@ -112,16 +151,50 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             status_code=500
         )
 
+def parse_order(req):
+    # Returns (order_data, None), or (None, error response) for a bad order.
+    # Malformed orders are rejected before anything else is done with them.
+    order_data, error = parse_order_body(req.get_body())
+    if error is not None:
+        return None, func.HttpResponse(error, status_code=400)
+    log.debug("Order received", order=LazyJson(order_data))
+    return order_data, None
+
+def build_order_event(order_data):
+    return {
+        "id": str(uuid.uuid4()),
+        "eventType": "newOrderReceived",
+        "subject": "NewOrder",
+        "eventTime": datetime.utcnow().isoformat(),
+        "data": {
+            "order_id": order_data["order_id"],
+            "fieldServiceId": order_data["fieldServiceId"],
+            "Material": order_data["Material"],
+            "delivery_address": order_data["delivery_address"],
+            "Status": order_data["Status"],
+            "driverLocation": order_data.get("driverLocation", {})
+        },
+        "dataVersion": "1.0"
+    }
+
+def warehouse_location(delivery_lat, delivery_lon, materials):
+    # Nearest depot that can fill the whole order, else the nearest one
+    filling, closest = get_warehouse_registry().nearest_with_fallback(delivery_lat, delivery_lon, materials)
+    return (filling or closest)[1].coordinates()
+
 def get_location(order_address, azure_maps_key):
-    geocode_url = f"https://atlas.microsoft.com/search/address/json?api-version=1.0&subscription-key={azure_maps_key}&query={order_address}"
-    response = requests.get(geocode_url)
-    print(response)
+    return get_geocode_cache().get_or_lookup(
+        order_address, lambda address: search_location(address, azure_maps_key)
+    )
+
+def search_location(order_address, azure_maps_key):
+    geocode_url = f"{AZURE_MAPS_URL}/search/address/json?api-version=1.0&subscription-key={azure_maps_key}&query={order_address}"
+    with timed("maps.geocode"):
+        response = get_client("maps").get(geocode_url)
     if response.status_code == 200:
         geocode_result = response.json()
-        print(geocode_result)
         if geocode_result['results']:
             coordinates = geocode_result['results'][0]['position']
-            print(coordinates)
             return coordinates['lat'], coordinates['lon']
         else:
             raise ValueError("Address not found.")
@@ -129,17 +202,56 @@ def get_location(order_address, azure_maps_key):
         raise Exception("Error calling Azure Maps Geocoding API.")
 
 def calculate_travel_time(warehouse_lat, warehouse_lon, delivery_lat, delivery_lon, azure_maps_key):
-    route_url = (
-        f"https://atlas.microsoft.com/route/directions/json?"
-        f"api-version=1.0&subscription-key={azure_maps_key}"
-        f"&query={warehouse_lat},{warehouse_lon}:{delivery_lat},{delivery_lon}"
+    route = get_route_cache().get_or_fetch(
+        (warehouse_lat, warehouse_lon),
+        (delivery_lat, delivery_lon),
+        lambda start, end: fetch_route(start, end, azure_maps_key),
     )
-    print(route_url)
-    response = requests.get(route_url)
+    if route is None:
+        raise Exception("No route found.")
+    return route.travel_time_minutes()
+
+def fetch_route(start, end, azure_maps_key):
+    url, params = route_request(AZURE_MAPS_URL, start, end, azure_maps_key)
+    with timed("maps.route"):
+        response = get_client("maps").get(url, params=params)
     if response.status_code == 200:
-        route_data = response.json()
-        travel_time_seconds = route_data['routes'][0]['summary']['travelTimeInSeconds']
-        travel_time_minutes = travel_time_seconds / 60
-        return round(travel_time_minutes, 2)
+        return response.json()
     else:
         raise Exception("Error calling Azure Maps Route API.")
+
+async def get_location_async(order_address, azure_maps_key):
+    return await get_geocode_cache().get_or_lookup_async(
+        order_address, lambda address: search_location_async(address, azure_maps_key)
+    )
+
+async def search_location_async(order_address, azure_maps_key):
+    with timed("maps.geocode"):
+        status, geocode_result = await get_json(
+            f"{AZURE_MAPS_URL}/search/address/json",
+            params={"api-version": "1.0", "subscription-key": azure_maps_key, "query": order_address},
+        )
+    if status != 200:
+        raise Exception("Error calling Azure Maps Geocoding API.")
+    if not geocode_result.get('results'):
+        raise ValueError("Address not found.")
+    coordinates = geocode_result['results'][0]['position']
+    return coordinates['lat'], coordinates['lon']
+
+async def calculate_travel_time_async(warehouse_lat, warehouse_lon, delivery_lat, delivery_lon, azure_maps_key):
+    route = await get_route_cache().get_or_fetch_async(
+        (warehouse_lat, warehouse_lon),
+        (delivery_lat, delivery_lon),
+        lambda start, end: fetch_route_async(start, end, azure_maps_key),
+    )
+    if route is None:
+        raise Exception("No route found.")
+    return route.travel_time_minutes()
+
+async def fetch_route_async(start, end, azure_maps_key):
+    url, params = route_request(AZURE_MAPS_URL, start, end, azure_maps_key)
+    with timed("maps.route"):
+        status, route_data = await get_json(url, params=params)
+    if status != 200:
+        raise Exception("Error calling Azure Maps Route API.")
+    return route_data
@@ -0,0 +1,248 @@
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from datetime import datetime
+
+ORDER_QUERY_LIMIT = int(os.environ.get("ORDER_QUERY_LIMIT", "100"))
+ORDER_QUERY_MAX_LIMIT = int(os.environ.get("ORDER_QUERY_MAX_LIMIT", "1000"))
+
+MICRODEGREES = 1000000
+NO_LOCATION = -2 ** 31
+DELIVERING = "Delivering_Order"
+
+
+class _Codes:
+    # Interns repeated strings (statuses, fieldServiceIds) as small ints
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class _Index:
+    # value code -> postings of (stamp, row) in stamp order. A row's entry
+    # is live while the row's stamp for this index still matches, so moving
+    # a row to another value is an append; stale entries are skipped and
+    # compacted away once they outnumber the live ones.
+
+    def __init__(self):
+        self.row_stamps = array("q")
+        self.postings = {}
+        self.live = {}
+
+    def add_row(self):
+        self.row_stamps.append(0)
+
+    def move(self, row, old_code, new_code, stamp):
+        stamps, rows = self.postings.setdefault(new_code, (array("q"), array("i")))
+        stamps.append(stamp)
+        rows.append(row)
+        self.row_stamps[row] = stamp
+        self.live[new_code] = self.live.get(new_code, 0) + 1
+        if old_code is not None:
+            self.live[old_code] -= 1
+            self._maybe_compact(old_code)
+
+    def page(self, code, cursor, limit, keep=None):
+        # Up to limit live rows with a stamp after cursor, and the cursor
+        # to pass for the next page (None on the last one)
+        stamps, rows = self.postings.get(code, ((), ()))
+        row_stamps = self.row_stamps
+        found = []
+        last = cursor
+        position = bisect_right(stamps, cursor)
+        while position < len(stamps):
+            row = rows[position]
+            if row_stamps[row] == stamps[position] and (keep is None or keep(row)):
+                if len(found) == limit:
+                    return found, last
+                found.append(row)
+                last = stamps[position]
+            position += 1
+        return found, None
+
+    def _maybe_compact(self, code):
+        stamps, rows = self.postings[code]
+        if len(stamps) < 1024 or len(stamps) < 2 * self.live[code]:
+            return
+        row_stamps = self.row_stamps
+        keep = [i for i in range(len(stamps)) if row_stamps[rows[i]] == stamps[i]]
+        self.postings[code] = (array("q", (stamps[i] for i in keep)), array("i", (rows[i] for i in keep)))
+
+
+class OrderStateStore:
+    # Current state of every order, projected from the status events:
+    # fieldServiceId, Status, the latest driver location and the time of the
+    # last change, one row per order in typed arrays rather than a dict per
+    # order, with statuses and fieldServiceIds interned. Indexed by
+    # order_id, fieldServiceId and Status; pages come back in the order the
+    # rows entered that fieldServiceId or Status, oldest first.
+    #
+    # Events may arrive late or twice: a status is only taken from an event
+    # at least as new as the last one applied, and a DriverLocation delta
+    # only on top of the update right before it (otherwise it waits for the
+    # next keyframe).
+
+    def __init__(self):
+        self._rows = {}
+        self._order_ids = []
+        self._field_service = array("i")
+        self._status = array("h")
+        self._lat = array("i")
+        self._lon = array("i")
+        self._location_seq = array("i")
+        self._updated = array("d")
+        self._field_services = _Codes()
+        self._statuses = _Codes()
+        self._by_field_service = _Index()
+        self._by_status = _Index()
+        self._stamp = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._order_ids)
+
+    def apply(self, event_type, data, event_time=None):
+        # Returns True when the event changed the stored state
+        if not isinstance(data, dict) or data.get("order_id") is None:
+            return False
+        updated = event_time.timestamp() if event_time is not None else time.time()
+        with self._lock:
+            row = self._row(str(data["order_id"]))
+            changed = False
+            if event_type == "DriverLocation":
+                changed = self._apply_location_update(row, data)
+                status = DELIVERING
+            else:
+                status = data.get("Status")
+                location = (data.get("driverLocation") or {}).get("currentLocation")
+                if location and updated >= self._updated[row]:
+                    changed = self._set_location(row, location.get("latitude"), location.get("longitude"),
+                                                 self._location_seq[row])
+            field_service_id = data.get("fieldServiceId")
+            if field_service_id is not None:
+                code = self._field_services.code(str(field_service_id))
+                if code != self._field_service[row]:
+                    old = self._field_service[row] if self._field_service[row] >= 0 else None
+                    self._field_service[row] = code
+                    self._by_field_service.move(row, old, code, self._next_stamp())
+                    changed = True
+            if status and updated >= self._updated[row]:
+                code = self._statuses.code(str(status))
+                if code != self._status[row]:
+                    old = self._status[row] if self._status[row] >= 0 else None
+                    self._status[row] = code
+                    self._by_status.move(row, old, code, self._next_stamp())
+                    changed = True
+                self._updated[row] = updated
+            return changed
+
+    def get(self, order_id):
+        with self._lock:
+            row = self._rows.get(order_id)
+            return None if row is None else self._state(row)
+
+    def query(self, field_service_id=None, status=None, cursor=0, limit=None):
+        # (states, next cursor); the cursor is None on the last page
+        limit = max(1, min(limit or ORDER_QUERY_LIMIT, ORDER_QUERY_MAX_LIMIT))
+        with self._lock:
+            status_code = self._statuses.codes.get(status) if status is not None else None
+            if field_service_id is not None:
+                code = self._field_services.codes.get(field_service_id)
+                if code is None or (status is not None and status_code is None):
+                    return [], None
+                keep = None if status is None else (lambda row: self._status[row] == status_code)
+                rows, next_cursor = self._by_field_service.page(code, cursor, limit, keep)
+            elif status is not None:
+                if status_code is None:
+                    return [], None
+                rows, next_cursor = self._by_status.page(status_code, cursor, limit)
+            else:
+                rows = range(cursor, min(cursor + limit, len(self._order_ids)))
+                next_cursor = rows.stop if rows.stop < len(self._order_ids) else None
+            return [self._state(row) for row in rows], next_cursor
+
+    def stats(self):
+        with self._lock:
+            return {
+                "orders": len(self._order_ids),
+                "statuses": {self._statuses.values[code]: count for code, count in self._by_status.live.items()},
+                "field_services": len(self._field_services.values),
+            }
+
+    def _row(self, order_id):
+        row = self._rows.get(order_id)
+        if row is None:
+            row = self._rows[order_id] = len(self._order_ids)
+            self._order_ids.append(order_id)
+            self._field_service.append(-1)
+            self._status.append(-1)
+            self._lat.append(NO_LOCATION)
+            self._lon.append(NO_LOCATION)
+            self._location_seq.append(0)
+            self._updated.append(0.0)
+            self._by_field_service.add_row()
+            self._by_status.add_row()
+        return row
+
+    def _next_stamp(self):
+        self._stamp += 1
+        return self._stamp
+
+    def _apply_location_update(self, row, data):
+        seq = data.get("seq")
+        if type(seq) is not int or seq <= self._location_seq[row]:
+            return False
+        if "lat" in data:
+            return self._set_location(row, data["lat"], data.get("lon"), seq)
+        if seq != self._location_seq[row] + 1 or self._lat[row] == NO_LOCATION:
+            return False
+        self._lat[row] += int(data.get("dlat", 0))
+        self._lon[row] += int(data.get("dlon", 0))
+        self._location_seq[row] = seq
+        return True
+
+    def _set_location(self, row, lat, lon, seq):
+        try:
+            lat = round(float(lat) * MICRODEGREES)
+            lon = round(float(lon) * MICRODEGREES)
+        except (TypeError, ValueError):
+            return False
+        self._lat[row] = lat
+        self._lon[row] = lon
+        self._location_seq[row] = seq
+        return True
+
+    def _state(self, row):
+        location = None
+        if self._lat[row] != NO_LOCATION:
+            location = {"latitude": self._lat[row] / MICRODEGREES, "longitude": self._lon[row] / MICRODEGREES}
+        field_service = self._field_service[row]
+        status = self._status[row]
+        return {
+            "order_id": self._order_ids[row],
+            "fieldServiceId": self._field_services.values[field_service] if field_service >= 0 else None,
+            "Status": self._statuses.values[status] if status >= 0 else None,
+            "driverLocation": location,
+            "updated": datetime.fromtimestamp(self._updated[row]).isoformat() if self._updated[row] else None,
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_order_states():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = OrderStateStore()
+        return _store
@@ -0,0 +1,92 @@
+import json
+import re
+
+from fast_json import JSONDecodeError, loads
+from order_schema import unwrap_order, validate_order
+
+_WHITESPACE = re.compile(r"[ \t\r\n]*")
+_decoder = json.JSONDecoder()
+
+
+def iter_orders(body):
+    # Yields (line, order, error) for each order in a bulk body, one at a
+    # time, so only the order being handled is ever decoded. The body is
+    # NDJSON (one order per line, blank lines skipped, line is the line
+    # number) or a JSON array (line is the position in the array), both
+    # 1-based. order is the unwrapped document when it could be decoded,
+    # else None; error is None for a valid order. A JSON array that turns
+    # out malformed, including anything but whitespace after its closing
+    # bracket, ends with one error entry for the position it broke at.
+    start = _skip_whitespace(body)
+    if body[start:start + 1] == b"[":
+        yield from _iter_array(body, start + 1)
+    else:
+        yield from _iter_lines(body, start)
+
+
+def _skip_whitespace(body):
+    position = 0
+    if body.startswith(b"\xef\xbb\xbf"):
+        position = 3
+    while position < len(body) and body[position] in b" \t\r\n":
+        position += 1
+    return position
+
+
+def _iter_lines(body, position):
+    line = body[:position].count(b"\n")
+    while position < len(body):
+        end = body.find(b"\n", position)
+        if end == -1:
+            end = len(body)
+        line += 1
+        raw = body[position:end].strip()
+        position = end + 1
+        if not raw:
+            continue
+        try:
+            decoded = loads(raw)
+        except (JSONDecodeError, ValueError, TypeError):
+            yield line, None, "Invalid JSON body."
+            continue
+        yield (line,) + _check(decoded)
+
+
+def _iter_array(body, position):
+    # The stdlib decoder can resume at an offset, which orjson cannot, so
+    # array elements are decoded with it one by one. It works on str, so
+    # this form does hold one decoded copy of the body for the request.
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        yield 1, None, "Invalid JSON body."
+        return
+    position = _WHITESPACE.match(text, len(body[:position].decode("utf-8-sig"))).end()
+    if text[position:position + 1] == "]":
+        if _WHITESPACE.match(text, position + 1).end() != len(text):
+            yield 1, None, "Invalid JSON body."
+        return
+    index = 0
+    while True:
+        index += 1
+        try:
+            decoded, position = _decoder.raw_decode(text, position)
+        except ValueError:
+            yield index, None, "Invalid JSON body."
+            return
+        yield (index,) + _check(decoded)
+        position = _WHITESPACE.match(text, position).end()
+        separator = text[position:position + 1]
+        if separator == "]":
+            if _WHITESPACE.match(text, position + 1).end() != len(text):
+                yield index + 1, None, "Invalid JSON body."
+            return
+        if separator != ",":
+            yield index + 1, None, "Invalid JSON body."
+            return
+        position = _WHITESPACE.match(text, position + 1).end()
+
+
+def _check(decoded):
+    order = unwrap_order(decoded)
+    return order, validate_order(order)
@@ -0,0 +1,83 @@
+import heapq
+import itertools
+import threading
+import time
+
+from telemetry import get_logger, increment
+
+log = get_logger(__name__)
+
+
+class PlaybackScheduler:
+    # Delay queue driven by a single background thread. Route playbacks put
+    # their steps here instead of sleeping inside the invocation, so one
+    # worker can drive many deliveries at once. Scheduled callables must not
+    # block: they only build an event and hand it to the publisher. The heap
+    # lives only in this process; whatever is pending when it stops is lost.
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def schedule(self, delay, func, *args):
+        due = time.monotonic() + delay
+        with self._cond:
+            heapq.heappush(self._heap, (due, next(self._counter), func, args))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="route-playback", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return len(self._heap)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                due, _, func, args = self._heap[0]
+                remaining = due - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                heapq.heappop(self._heap)
+            try:
+                func(*args)
+            except Exception as e:
+                increment("playback.failed")
+                log.error("Route playback step failed", error=str(e))
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = PlaybackScheduler()
+        return _scheduler
+
+
+def select_route_points(route_points, num_points_to_send=9):
+    # Pick num_points_to_send points spread by index plus the destination
+    total_points = len(route_points)
+    step = max(1, (total_points - 1) // num_points_to_send)
+    points_to_send = [
+        (i, route_points[i])
+        for i in range(0, total_points - 1, step)
+    ][:num_points_to_send]
+    points_to_send.append((total_points - 1, route_points[-1]))
+    return points_to_send
+
+
+def schedule_playback(steps, send_step, interval, scheduler=None):
+    # Step i fires i * interval seconds from now; returns immediately
+    scheduler = scheduler or get_scheduler()
+    for i, step in enumerate(steps):
+        scheduler.schedule(i * interval, send_step, step)
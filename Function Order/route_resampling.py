@@ -0,0 +1,145 @@
+import numpy as np
+
+EARTH_RADIUS_METERS = 6371008.8
+
+
+def route_array(route_points):
+    # (N, 2) float64 array of lat/lon from a routing.Route (zero copy) or an
+    # Azure Maps style list of {"latitude", "longitude"} dicts
+    coordinates = getattr(route_points, "coordinates", None)
+    if coordinates is not None:
+        return np.frombuffer(coordinates, dtype=np.float64).reshape(-1, 2)
+    return np.array(
+        [(point["latitude"], point["longitude"]) for point in route_points],
+        dtype=np.float64,
+    ).reshape(-1, 2)
+
+
+def segment_lengths(coords):
+    # Haversine length in meters of each of the N - 1 segments
+    lat = np.radians(coords[:, 0])
+    lon = np.radians(coords[:, 1])
+    dlat = np.diff(lat)
+    dlon = np.diff(lon)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def cumulative_distance(coords):
+    distance = np.zeros(len(coords))
+    if len(coords) > 1:
+        np.cumsum(segment_lengths(coords), out=distance[1:])
+    return distance
+
+
+def _interpolate(coords, positions, targets):
+    # Linear interpolation of lat and lon at targets along a monotonic axis
+    return np.column_stack((
+        np.interp(targets, positions, coords[:, 0]),
+        np.interp(targets, positions, coords[:, 1]),
+    ))
+
+
+def resample_by_distance(coords, num_samples):
+    # num_samples points evenly spaced along the route, including both ends
+    if len(coords) < 2 or num_samples < 2:
+        return coords[-1:].copy() if num_samples == 1 else coords.copy()
+    distance = cumulative_distance(coords)
+    return _interpolate(coords, distance, np.linspace(0.0, distance[-1], num_samples))
+
+
+def resample_by_time(coords, times, num_samples):
+    # times: seconds from departure at each route point (non-decreasing)
+    times = np.asarray(times, dtype=np.float64)
+    if len(coords) < 2 or num_samples < 2:
+        return coords[-1:].copy() if num_samples == 1 else coords.copy()
+    return _interpolate(coords, times, np.linspace(times[0], times[-1], num_samples))
+
+
+def point_times(coords, travel_time_seconds, time_marks=None):
+    # Seconds from departure at each route point. Guidance time marks
+    # ((pointIndex, seconds) pairs) are interpolated by distance between
+    # marks; without them the route is assumed to be driven at constant speed.
+    distance = cumulative_distance(coords)
+    if time_marks is not None and len(time_marks) >= 4:
+        marks = np.asarray(time_marks, dtype=np.float64).reshape(-1, 2)
+        indices = np.clip(marks[:, 0].astype(np.int64), 0, len(coords) - 1)
+        return np.interp(distance, distance[indices], marks[:, 1])
+    if distance[-1] == 0:
+        return np.zeros(len(coords))
+    return distance / distance[-1] * (travel_time_seconds or 0.0)
+
+
+def simplify(coords, tolerance_meters):
+    return coords[simplify_mask(coords, tolerance_meters)]
+
+
+def simplify_mask(coords, tolerance_meters):
+    # Douglas-Peucker on a local equirectangular projection; True for the
+    # points to keep, always including the first and last
+    n = len(coords)
+    if n < 3 or tolerance_meters <= 0:
+        return np.ones(n, dtype=bool)
+    scale = np.radians(1.0) * EARTH_RADIUS_METERS
+    y = coords[:, 0] * scale
+    x = coords[:, 1] * scale * np.cos(np.radians(coords[:, 0].mean()))
+
+    # All open segments of a level are split in one pass: the points not yet
+    # kept or settled are measured against their segment's chord together,
+    # and each segment keeps its farthest point if that lies beyond the
+    # tolerance, so the work is a few array operations per level rather
+    # than per segment.
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    # Open segments (first, last point index) and how many of the points
+    # still being measured lie in each; those points are kept in order
+    first = np.array([0])
+    last = np.array([n - 1])
+    counts = np.array([n - 2])
+    points = np.arange(1, n - 1)
+    xp = x[1:-1]
+    yp = y[1:-1]
+    while len(points):
+        dx = x[last] - x[first]
+        dy = y[last] - y[first]
+        length = np.hypot(dx, dy)
+        degenerate = length == 0
+        length[degenerate] = 1.0
+        px = xp - np.repeat(x[first], counts)
+        py = yp - np.repeat(y[first], counts)
+        distances = np.repeat(dx / length, counts) * py
+        distances -= np.repeat(dy / length, counts) * px
+        np.abs(distances, out=distances)
+        if degenerate.any():
+            # A closed chord: distance to its (single) end point
+            closed = np.repeat(degenerate, counts)
+            distances[closed] = np.hypot(px[closed], py[closed])
+        starts = np.cumsum(counts) - counts
+        maxima = np.maximum.reduceat(distances, starts)
+        # The first point at each segment's maximum, as np.argmax would pick
+        at_max = np.flatnonzero(distances == np.repeat(maxima, counts))
+        owner = np.searchsorted(starts, at_max, side="right") - 1
+        firsts = np.ones(len(at_max), dtype=bool)
+        firsts[1:] = owner[1:] != owner[:-1]
+        farthest = at_max[firsts]
+        split = maxima > tolerance_meters
+        farthest = farthest[split]
+        index = points[farthest]
+        keep[index] = True
+        # Settled segments and the new kept points drop out; each split
+        # segment becomes two, empty ones are dropped
+        remaining = np.repeat(split, counts)
+        remaining[farthest] = False
+        points = points[remaining]
+        xp = xp[remaining]
+        yp = yp[remaining]
+        left = farthest - starts[split]
+        right = counts[split] - left - 1
+        first = np.column_stack((first[split], index)).ravel()
+        last = np.column_stack((index, last[split])).ravel()
+        counts = np.column_stack((left, right)).ravel()
+        nonempty = counts > 0
+        first = first[nonempty]
+        last = last[nonempty]
+        counts = counts[nonempty]
+    return keep
@@ -0,0 +1,153 @@
+import os
+import threading
+from array import array
+from collections import OrderedDict
+
+ROUTE_CACHE_SIZE = int(os.environ.get("ROUTE_CACHE_SIZE", "1024"))
+ROUTE_CACHE_MAX_POINTS = int(os.environ.get("ROUTE_CACHE_MAX_POINTS", "2000000"))
+# Origins/destinations are snapped to this grid (in degrees, ~11 m) so that
+# geocoder jitter on the same site still hits the cache
+ROUTE_GRID = float(os.environ.get("ROUTE_GRID", "0.0001"))
+
+
+class Route:
+    # One Azure Maps route/directions result: the leg geometry packed as
+    # interleaved lat/lon doubles (16 bytes per point) plus the summary.
+    # time_marks holds (pointIndex, travelTimeInSeconds) pairs from the
+    # guidance instructions when the route was requested with them.
+    __slots__ = ("coordinates", "time_marks", "travel_time_seconds", "length_meters", "summary")
+
+    def __init__(self, coordinates, summary, time_marks=None):
+        self.coordinates = coordinates
+        self.time_marks = time_marks if time_marks is not None else array("d")
+        self.summary = summary
+        self.travel_time_seconds = summary.get("travelTimeInSeconds")
+        self.length_meters = summary.get("lengthInMeters")
+
+    def __len__(self):
+        return len(self.coordinates) // 2
+
+    def points(self):
+        # Same shape as Azure Maps legs[0].points
+        coordinates = self.coordinates
+        return [
+            {"latitude": coordinates[i], "longitude": coordinates[i + 1]}
+            for i in range(0, len(coordinates), 2)
+        ]
+
+    def travel_time_minutes(self):
+        return round(self.travel_time_seconds / 60, 2)
+
+
+def parse_route(route_info):
+    routes = route_info.get("routes") if isinstance(route_info, dict) else None
+    if not routes:
+        return None
+    route = routes[0]
+    coordinates = array("d")
+    for leg in route.get("legs", []):
+        for point in leg.get("points", []):
+            coordinates.append(point["latitude"])
+            coordinates.append(point["longitude"])
+    time_marks = array("d")
+    for instruction in route.get("guidance", {}).get("instructions", []):
+        if "pointIndex" in instruction and "travelTimeInSeconds" in instruction:
+            time_marks.append(instruction["pointIndex"])
+            time_marks.append(instruction["travelTimeInSeconds"])
+    return Route(coordinates, route.get("summary", {}), time_marks)
+
+
+def route_request(maps_url, start, end, key):
+    # (url, params) of the route/directions call behind every RouteCache
+    # entry. All callers share the cache, so they must all ask for the same
+    # thing: coded instructions are what time_marks are parsed from.
+    return f"{maps_url}/route/directions/json", {
+        "api-version": "1.0",
+        "subscription-key": key,
+        "query": f"{start[0]},{start[1]}:{end[0]},{end[1]}",
+        "instructionsType": "coded",
+    }
+
+
+def snap(coords, grid=ROUTE_GRID):
+    return (round(coords[0] / grid), round(coords[1] / grid))
+
+
+class RouteCache:
+    # LRU keyed by grid-snapped (origin, destination), bounded both by number
+    # of routes and by the total number of cached points.
+
+    def __init__(self, max_entries=ROUTE_CACHE_SIZE, max_points=ROUTE_CACHE_MAX_POINTS, grid=ROUTE_GRID):
+        self.max_entries = max_entries
+        self.max_points = max_points
+        self.grid = grid
+        self._routes = OrderedDict()
+        self._points = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, start, end):
+        return snap(start, self.grid) + snap(end, self.grid)
+
+    def get(self, start, end):
+        key = self.key(start, end)
+        with self._lock:
+            route = self._routes.get(key)
+            if route is None:
+                self.misses += 1
+                return None
+            self._routes.move_to_end(key)
+            self.hits += 1
+            return route
+
+    def put(self, start, end, route):
+        key = self.key(start, end)
+        with self._lock:
+            previous = self._routes.pop(key, None)
+            if previous is not None:
+                self._points -= len(previous)
+            self._routes[key] = route
+            self._points += len(route)
+            while self._routes and (len(self._routes) > self.max_entries or self._points > self.max_points):
+                _, evicted = self._routes.popitem(last=False)
+                self._points -= len(evicted)
+
+    def get_or_fetch(self, start, end, fetch):
+        # fetch(start, end) returns the raw route/directions JSON
+        route = self.get(start, end)
+        if route is None:
+            route = parse_route(fetch(start, end))
+            if route is not None:
+                self.put(start, end, route)
+        return route
+
+    async def get_or_fetch_async(self, start, end, fetch):
+        # Same as get_or_fetch with a coroutine fetch
+        route = self.get(start, end)
+        if route is None:
+            route = parse_route(await fetch(start, end))
+            if route is not None:
+                self.put(start, end, route)
+        return route
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._routes),
+                "points": self._points,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_route_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = RouteCache()
+        return _cache
@@ -0,0 +1,78 @@
+import importlib
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from telemetry import get_logger
+
+# "background" runs the warm-up steps on a thread as soon as the app module
+# has loaded, overlapping the host's own startup; "blocking" runs them while
+# the module loads; "off" leaves everything to the first invocation.
+STARTUP_WARMUP = os.environ.get("STARTUP_WARMUP", "background")
+
+log = get_logger(__name__)
+
+_timings = {}
+_timings_lock = threading.Lock()
+_done = threading.Event()
+
+
+def record(name, seconds):
+    with _timings_lock:
+        _timings.setdefault(name, round(seconds * 1000, 3))
+
+
+@contextmanager
+def phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def preload(*module_names):
+    # Imports modules ahead of the first call that needs them, timing each
+    # one that was not loaded yet
+    for module_name in module_names:
+        if module_name not in sys.modules:
+            with phase(f"import.{module_name}"):
+                importlib.import_module(module_name)
+
+
+def warm_up(steps, mode=None):
+    # steps: (name, callable) pairs, run in order; a failing step is logged
+    # and does not stop the others
+    mode = mode or STARTUP_WARMUP
+    if mode == "off":
+        _done.set()
+        return None
+
+    def run():
+        for name, step in steps:
+            try:
+                with phase(f"warmup.{name}"):
+                    step()
+            except Exception as e:
+                log.warning("Warm-up step failed", step=name, error=str(e))
+        _done.set()
+        log.info("Startup complete", **{name.replace(".", "_"): ms for name, ms in report().items()})
+
+    if mode == "blocking":
+        run()
+        return None
+    thread = threading.Thread(target=run, name="startup-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_for_warmup(timeout=None):
+    return _done.wait(timeout)
+
+
+def report():
+    # {phase: milliseconds} in the order the phases finished
+    with _timings_lock:
+        return dict(_timings)
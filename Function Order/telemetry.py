@@ -0,0 +1,178 @@
+import asyncio
+import functools
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from fast_json import dumps
+
+# Fraction of debug/info records that are emitted; warnings and errors are
+# never sampled
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "1.0"))
+
+
+class LazyJson:
+    # Serialized only if a handler actually formats the record
+    __slots__ = ("obj",)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self):
+        return dumps(self.obj).decode("utf-8")
+
+
+class _Fields:
+    __slots__ = ("fields",)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        return " ".join(f"{key}={value}" for key, value in self.fields.items())
+
+
+class StructuredLogger:
+    # log.info("Order received", order_id=order_id, status=status)
+    # Nothing is formatted, serialized or sampled unless the level is enabled.
+
+    def __init__(self, name, sample_rate=None):
+        self.logger = logging.getLogger(name)
+        self.sample_rate = LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+
+    def debug(self, msg, **fields):
+        self._log(logging.DEBUG, msg, fields, True)
+
+    def info(self, msg, **fields):
+        self._log(logging.INFO, msg, fields, True)
+
+    def warning(self, msg, **fields):
+        self._log(logging.WARNING, msg, fields, False)
+
+    def error(self, msg, **fields):
+        self._log(logging.ERROR, msg, fields, False)
+
+    def _log(self, level, msg, fields, sampled):
+        if not self.logger.isEnabledFor(level):
+            return
+        if sampled and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        if fields:
+            self.logger.log(level, "%s %s", msg, _Fields(fields), extra={"fields": fields})
+        else:
+            self.logger.log(level, msg)
+
+
+def get_logger(name):
+    return StructuredLogger(name)
+
+
+# Latency buckets from 0.25 ms, growing by sqrt(2), up to about 4 minutes
+_BUCKETS_MS = tuple(0.25 * 2 ** (i / 2) for i in range(41))
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect_left(_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, p):
+        # Upper bound of the bucket holding the p-th percentile
+        target = self.count * p / 100
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                return _BUCKETS_MS[i] if i < len(_BUCKETS_MS) else self.max
+        return 0.0
+
+    def snapshot(self):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count, 3),
+            "p50_ms": round(min(self.percentile(50), self.max), 3),
+            "p90_ms": round(min(self.percentile(90), self.max), 3),
+            "p99_ms": round(min(self.percentile(99), self.max), 3),
+            "max_ms": round(self.max, 3),
+        }
+
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+
+def increment(name, value=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name, seconds):
+    ms = seconds * 1000
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(ms)
+
+
+@contextmanager
+def timed(name):
+    # Records the duration under `name` and counts failures as name.errors
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        increment(f"{name}.errors")
+        raise
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def instrumented(name):
+    # Decorator form of timed() for plain and async functions
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timed(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def snapshot():
+    with _lock:
+        return {
+            "latency": {name: h.snapshot() for name, h in sorted(_histograms.items())},
+            "counters": dict(sorted(_counters.items())),
+        }
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
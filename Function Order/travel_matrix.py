@@ -0,0 +1,113 @@
+import os
+import threading
+from collections import OrderedDict
+
+from routing import ROUTE_GRID, snap
+
+# Azure Maps answers up to 700 origin x destination cells per matrix request
+ROUTE_MATRIX_MAX_CELLS = int(os.environ.get("ROUTE_MATRIX_MAX_CELLS", "700"))
+TRAVEL_TIME_CACHE_SIZE = int(os.environ.get("TRAVEL_TIME_CACHE_SIZE", "200000"))
+
+
+def parse_matrix(matrix_result):
+    # Rows of travelTimeInSeconds (None where no route was found) from a
+    # Route Matrix response
+    return [
+        [
+            cell.get("response", {}).get("routeSummary", {}).get("travelTimeInSeconds")
+            if cell.get("statusCode") == 200 else None
+            for cell in row
+        ]
+        for row in matrix_result.get("matrix", [])
+    ]
+
+
+def matrix_requests(origins, destinations, max_cells=ROUTE_MATRIX_MAX_CELLS):
+    # Split origins x destinations into (origin slice, destination slice)
+    # blocks of at most max_cells cells each
+    origin_step = max(1, min(len(origins), max_cells))
+    for i in range(0, len(origins), origin_step):
+        origin_chunk = origins[i:i + origin_step]
+        destination_step = max(1, max_cells // len(origin_chunk))
+        for j in range(0, len(destinations), destination_step):
+            yield (i, origin_chunk), (j, destinations[j:j + destination_step])
+
+
+class TravelTimeCache:
+    # LRU of travel times in seconds keyed by grid-snapped (origin,
+    # destination), filled a whole matrix at a time. Only pairs with a route
+    # are kept, so unreachable ones are asked for again next time.
+
+    def __init__(self, max_entries=TRAVEL_TIME_CACHE_SIZE, grid=ROUTE_GRID, max_cells=ROUTE_MATRIX_MAX_CELLS):
+        self.max_entries = max_entries
+        self.grid = grid
+        self.max_cells = max_cells
+        self._times = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def matrix(self, origins, destinations, fetch_matrix):
+        # origins x destinations table of seconds (None when unreachable).
+        # fetch_matrix(origins, destinations) returns the raw Route Matrix
+        # JSON; it is only called for the pairs not cached yet, with
+        # duplicate points sent once.
+        origin_keys = [snap(point, self.grid) for point in origins]
+        destination_keys = [snap(point, self.grid) for point in destinations]
+        table = [[None] * len(destinations) for _ in origins]
+        missing_origins = {}
+        missing_destinations = {}
+        with self._lock:
+            for i, origin_key in enumerate(origin_keys):
+                for j, destination_key in enumerate(destination_keys):
+                    seconds = self._times.get(origin_key + destination_key)
+                    if seconds is None:
+                        self.misses += 1
+                        missing_origins.setdefault(origin_key, origins[i])
+                        missing_destinations.setdefault(destination_key, destinations[j])
+                    else:
+                        self._times.move_to_end(origin_key + destination_key)
+                        self.hits += 1
+                        table[i][j] = seconds
+
+        if missing_origins:
+            fetched = {}
+            origin_items = list(missing_origins.items())
+            destination_items = list(missing_destinations.items())
+            for (_, origin_chunk), (_, destination_chunk) in matrix_requests(
+                    origin_items, destination_items, self.max_cells):
+                rows = parse_matrix(fetch_matrix(
+                    [point for _, point in origin_chunk],
+                    [point for _, point in destination_chunk],
+                ))
+                for (origin_key, _), row in zip(origin_chunk, rows):
+                    for (destination_key, _), seconds in zip(destination_chunk, row):
+                        if seconds is not None:
+                            fetched[origin_key + destination_key] = seconds
+            with self._lock:
+                for key, seconds in fetched.items():
+                    self._times[key] = seconds
+                    self._times.move_to_end(key)
+                while len(self._times) > self.max_entries:
+                    self._times.popitem(last=False)
+            for i, origin_key in enumerate(origin_keys):
+                for j, destination_key in enumerate(destination_keys):
+                    if table[i][j] is None:
+                        table[i][j] = fetched.get(origin_key + destination_key)
+        return table
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._times)}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_travel_time_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TravelTimeCache()
+        return _cache
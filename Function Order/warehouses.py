@@ -0,0 +1,212 @@
+import json
+import math
+import os
+import threading
+
+WAREHOUSES_PATH = os.environ.get("WAREHOUSES_PATH", "")
+WAREHOUSE_GRID_DEGREES = float(os.environ.get("WAREHOUSE_GRID_DEGREES", "0.25"))
+
+# Used when WAREHOUSES_PATH is not set
+DEFAULT_WAREHOUSES = [
+    {"warehouse_id": "coimbra", "latitude": 39.91344, "longitude": -8.43924},
+]
+
+EARTH_RADIUS_METERS = 6371008.8
+METERS_PER_DEGREE = math.radians(1.0) * EARTH_RADIUS_METERS
+
+
+def distance_meters(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def required_quantities(materials):
+    # {"material_id": total quantity} for an order's Material list
+    needed = {}
+    for material in materials or []:
+        material_id = material["material_id"]
+        needed[material_id] = needed.get(material_id, 0) + material["quantity"]
+    return needed
+
+
+class Warehouse:
+    __slots__ = ("warehouse_id", "lat", "lon", "stock")
+
+    def __init__(self, warehouse_id, lat, lon, stock=None):
+        self.warehouse_id = warehouse_id
+        self.lat = float(lat)
+        self.lon = float(lon)
+        # Stock as configured in WAREHOUSES_PATH; nothing updates it at run
+        # time (the status events carry no per-depot levels), so the filter
+        # in nearest() is a static capability check, not live inventory.
+        # None means stock is not tracked here and the depot takes any order.
+        self.stock = None if stock is None else dict(stock)
+
+    def coordinates(self):
+        return (self.lat, self.lon)
+
+    def can_fill(self, needed):
+        if self.stock is None:
+            return True
+        return all(self.stock.get(material_id, 0) >= quantity for material_id, quantity in needed.items())
+
+
+class WarehouseRegistry:
+    # Depots bucketed on a lat/lon grid. nearest() scans rings of cells
+    # outwards from the delivery point and stops once no unvisited cell can
+    # hold anything closer than what it already found, so a lookup touches a
+    # handful of depots however many are registered.
+
+    def __init__(self, warehouses=(), cell_degrees=WAREHOUSE_GRID_DEGREES):
+        self.cell_degrees = cell_degrees
+        self._warehouses = {}
+        self._cells = {}
+        self._extent = None
+        self._lock = threading.Lock()
+        for warehouse in warehouses:
+            self.add(warehouse)
+
+    @classmethod
+    def from_config(cls, entries, cell_degrees=WAREHOUSE_GRID_DEGREES):
+        return cls(
+            (Warehouse(entry["warehouse_id"], entry["latitude"], entry["longitude"], entry.get("stock"))
+             for entry in entries),
+            cell_degrees,
+        )
+
+    def __len__(self):
+        return len(self._warehouses)
+
+    def get(self, warehouse_id):
+        return self._warehouses.get(warehouse_id)
+
+    def warehouses(self):
+        with self._lock:
+            return list(self._warehouses.values())
+
+    def add(self, warehouse):
+        with self._lock:
+            self._remove(warehouse.warehouse_id)
+            self._warehouses[warehouse.warehouse_id] = warehouse
+            self._cells.setdefault(self._cell(warehouse.lat, warehouse.lon), []).append(warehouse)
+            self._extent = None
+
+    def remove(self, warehouse_id):
+        with self._lock:
+            self._remove(warehouse_id)
+
+    def nearest(self, lat, lon, materials=None, count=1):
+        # Up to `count` (distance in meters, Warehouse) pairs, closest first,
+        # among the depots whose configured stock covers the whole Material list
+        return self._search(lat, lon, required_quantities(materials), count, False)[0]
+
+    def nearest_with_fallback(self, lat, lon, materials=None):
+        # (filling, closest) from one search: the nearest depot that can fill
+        # the whole Material list and the nearest depot at all, each a
+        # (distance in meters, Warehouse) pair or None
+        found, closest = self._search(lat, lon, required_quantities(materials), 1, True)
+        return (found[0] if found else None), closest
+
+    def _search(self, lat, lon, needed, count, fallback):
+        with self._lock:
+            if not self._cells:
+                return [], None
+            row, col = self._cell(lat, lon)
+            if self._extent is None:
+                rows = [cell[0] for cell in self._cells]
+                cols = [cell[1] for cell in self._cells]
+                self._extent = (min(rows), max(rows), min(cols), max(cols))
+            min_row, max_row, min_col, max_col = self._extent
+            max_ring = max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+            found = []
+            closest = None
+            by_ring = None
+            for ring in range(max_ring + 1):
+                # Every filling depot is a candidate for closest too, so once
+                # found is settled closest is as well
+                if len(found) >= count and found[count - 1][0] <= self._ring_bound(lat, ring):
+                    break
+                # Once the rings would cover more cells than are occupied (a
+                # sparse extent, or no depot passing the filter), the
+                # occupied cells left are grouped by ring instead, so empty
+                # cells are no longer visited
+                if by_ring is None and (2 * ring + 1) ** 2 > len(self._cells):
+                    by_ring = {}
+                    for cell in self._cells:
+                        distance = max(abs(cell[0] - row), abs(cell[1] - col))
+                        if distance >= ring:
+                            by_ring.setdefault(distance, []).append(cell)
+                if by_ring is not None:
+                    if not by_ring:
+                        break
+                    cells = by_ring.pop(ring, ())
+                else:
+                    cells = self._ring(row, col, ring)
+                for cell in cells:
+                    for warehouse in self._cells.get(cell, ()):
+                        fills = warehouse.can_fill(needed)
+                        if not (fills or fallback):
+                            continue
+                        distance = distance_meters(lat, lon, warehouse.lat, warehouse.lon)
+                        if fallback and (closest is None or distance < closest[0]):
+                            closest = (distance, warehouse)
+                        if fills:
+                            found.append((distance, warehouse))
+                found.sort(key=lambda pair: pair[0])
+        return found[:count], closest
+
+    def _remove(self, warehouse_id):
+        warehouse = self._warehouses.pop(warehouse_id, None)
+        if warehouse is None:
+            return
+        cell = self._cell(warehouse.lat, warehouse.lon)
+        bucket = self._cells[cell]
+        bucket.remove(warehouse)
+        if not bucket:
+            del self._cells[cell]
+        self._extent = None
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees))
+
+    def _ring_bound(self, lat, ring):
+        # Lower bound on the distance to any depot outside rings 0..ring-1.
+        # A cell is narrowest (in meters) at the highest latitude it reaches.
+        if ring == 0:
+            return 0.0
+        gap = (ring - 1) * self.cell_degrees
+        highest = min(89.9, abs(lat) + (ring + 1) * self.cell_degrees)
+        return gap * METERS_PER_DEGREE * math.cos(math.radians(highest))
+
+    def _ring(self, row, col, ring):
+        if ring == 0:
+            yield (row, col)
+            return
+        for c in range(col - ring, col + ring + 1):
+            yield (row - ring, c)
+            yield (row + ring, c)
+        for r in range(row - ring + 1, row + ring):
+            yield (r, col - ring)
+            yield (r, col + ring)
+
+
+def load_warehouses(path=WAREHOUSES_PATH):
+    # JSON list of {"warehouse_id", "latitude", "longitude", "stock"?}
+    if not path:
+        return DEFAULT_WAREHOUSES
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_warehouse_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = WarehouseRegistry.from_config(load_warehouses())
+        return _registry
@@ -0,0 +1,132 @@
+import itertools
+import os
+import threading
+
+from inventory import order_quantities
+
+# "fifo" releases waiting orders oldest first; "priority" releases orders
+# with a higher numeric "priority" field first, oldest first among equals
+BACKORDER_POLICY = os.environ.get("BACKORDER_POLICY", "fifo")
+
+
+class Backorder:
+    def __init__(self, order, seq, policy):
+        self.order = order
+        self.order_id = order.get("order_id")
+        self.materials = order.get("Material", [])
+        priority = order.get("priority", 0)
+        if type(priority) not in (int, float) or policy != "priority":
+            priority = 0
+        self.sort_key = (-priority, seq)
+        self.short = ()
+
+
+class BackorderQueue:
+    # Orders that could not be filled, indexed by the material_ids they are
+    # short on. A restock only looks at the orders waiting on the restocked
+    # materials, so its cost follows the orders it affects rather than the
+    # whole backlog. An order short on several materials is re-indexed on
+    # whatever it is still short on after each attempt.
+
+    def __init__(self, inventory, policy=None):
+        self.inventory = inventory
+        self.policy = policy or BACKORDER_POLICY
+        self._orders = {}
+        # material_id -> {order_id: None}, insertion ordered, O(1) removal
+        self._waiting = {}
+        self._seq = itertools.count()
+        self._released = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._orders)
+
+    def add(self, order):
+        # Queues an order whose reservation just failed. Returns True when
+        # it could be reserved after all (stock arrived in between), in
+        # which case it is not queued.
+        order_id = order.get("order_id")
+        with self._lock:
+            if order_id in self._orders:
+                return False
+            backorder = Backorder(order, next(self._seq), self.policy)
+            self._orders[order_id] = backorder
+            self._index(backorder, order_quantities(backorder.materials).keys())
+            # Indexed before this second look, so a restock landing in
+            # between either sees the order or is seen by it
+            return bool(self._release([backorder]))
+
+    def restock(self, quantities):
+        # Adds stock, then reserves the waiting orders it may unblock in
+        # policy order. Returns the released Backorders.
+        self.inventory.restock(quantities)
+        with self._lock:
+            affected = {}
+            for material_id in quantities:
+                for order_id in self._waiting.get(material_id, ()):
+                    affected[order_id] = self._orders[order_id]
+            return self._release(sorted(affected.values(), key=lambda b: b.sort_key))
+
+    def requeue(self, backorder):
+        # Puts a released order back in its old place, e.g. when its
+        # ready_for_pickup event could not be sent and the stock was given
+        # back. It is indexed on all its materials and checked again on the
+        # next restock of any of them.
+        with self._lock:
+            if backorder.order_id in self._orders:
+                return
+            self._orders[backorder.order_id] = backorder
+            self._index(backorder, order_quantities(backorder.materials).keys())
+            self._released -= 1
+
+    def remove(self, order_id):
+        # Takes a queued order out again, e.g. when its pending_inventory
+        # event could not be sent and Event Grid will deliver it once more.
+        # Returns False when a restock released it in between, in which
+        # case it is already reserved and its ready_for_pickup handled.
+        with self._lock:
+            backorder = self._orders.pop(order_id, None)
+            if backorder is None:
+                return False
+            self._index(backorder, ())
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "waiting": len(self._orders),
+                "released": self._released,
+                "short": {material_id: len(orders) for material_id, orders in self._waiting.items()},
+            }
+
+    def _release(self, backorders):
+        # Each order is all-or-nothing; one that cannot be filled does not
+        # hold back smaller orders behind it
+        if not backorders:
+            return []
+        reserved = self.inventory.reserve_many([backorder.materials for backorder in backorders])
+        released = []
+        for backorder, ok in zip(backorders, reserved):
+            if ok:
+                del self._orders[backorder.order_id]
+                self._index(backorder, ())
+                released.append(backorder)
+            else:
+                # Stock given back meanwhile can leave no shortage to wait
+                # on; fall back to all of its materials
+                short = self.inventory.shortages(backorder.materials)
+                self._index(backorder, (short or order_quantities(backorder.materials)).keys())
+        self._released += len(released)
+        return released
+
+    def _index(self, backorder, material_ids):
+        short = tuple(material_ids)
+        for material_id in backorder.short:
+            if material_id not in short:
+                waiting = self._waiting[material_id]
+                del waiting[backorder.order_id]
+                if not waiting:
+                    del self._waiting[material_id]
+        for material_id in short:
+            self._waiting.setdefault(material_id, {})[backorder.order_id] = None
+        backorder.short = short
@@ -1,14 +1,31 @@
+import time
+_load_start = time.perf_counter()
+
 import azure.functions as func
-import json
-import logging
-import requests
+import os
 import uuid
 from datetime import datetime
 
+from dedup import event_keys, get_deduplicator
+from fast_json import JSONDecodeError, dumps, loads
+from backorders import BackorderQueue
+from inventory import InventoryStore, order_quantities
+from order_schema import validate_materials
+from startup import phase, preload, record, report as startup_report, warm_up
+from telemetry import LazyJson, get_logger, increment, instrumented, snapshot
+
 app = func.FunctionApp(http_auth_level=func.AuthLevel.FUNCTION)
 
+log = get_logger(__name__)
+
+# eventgrid_publisher pulls in requests, a third of the cold start; it is
+# imported on first use, or earlier by the warm-up at the end of this module
+def get_publisher(endpoint, key):
+    from eventgrid_publisher import get_publisher as shared_publisher
+    return shared_publisher(endpoint, key)
+
 # Define a list of 10 materials with their ids and available quantity
-inventory = [
+INITIAL_INVENTORY = [
     {"material_id": "cimento", "quantity": 10},
     {"material_id": "tijolo", "quantity": 15},
     {"material_id": "areia", "quantity": 8},
@@ -19,19 +36,54 @@ inventory = [
     {"material_id": "telha", "quantity": 14},
 ]
 
-EVENT_GRID_ENDPOINT = "https://requestmaterial.northeurope-1.eventgrid.azure.net/api/events"  # Replace with your Event Grid endpoint
-EVENT_GRID_KEY = "/JWICDpSsXlFLAnd8kZTIbU4ZobzsM66gAZEGAMSnm4="  # Replace with your Event Grid key
+# Set INVENTORY_TABLE_CONNECTION (e.g. "UseDevelopmentStorage=true" for
+# Azurite) to keep stock in Table storage instead of in this process
+INVENTORY_TABLE_CONNECTION = os.environ.get("INVENTORY_TABLE_CONNECTION", "")
+INVENTORY_TABLE_NAME = os.environ.get("INVENTORY_TABLE_NAME", "inventory")
+
+
+def create_inventory_store():
+    if not INVENTORY_TABLE_CONNECTION:
+        return InventoryStore(INITIAL_INVENTORY)
+    from inventory_table import TableInventoryStore
+    store = TableInventoryStore.from_connection_string(INVENTORY_TABLE_CONNECTION, INVENTORY_TABLE_NAME)
+    store.seed(INITIAL_INVENTORY)
+    return store
+
+
+with phase("init.inventory"):
+    inventory = create_inventory_store()
+# Orders waiting for stock, released by the restock route
+backorders = BackorderQueue(inventory)
+
+EVENT_GRID_ENDPOINT = os.environ.get(
+    "WAREHOUSE_EVENT_GRID_ENDPOINT", "https://requestmaterial.northeurope-1.eventgrid.azure.net/api/events"
+)
+EVENT_GRID_KEY = os.environ.get("WAREHOUSE_EVENT_GRID_KEY", "/JWICDpSsXlFLAnd8kZTIbU4ZobzsM66gAZEGAMSnm4=")
+SUBSCRIPTION_VALIDATION_EVENT = "Microsoft.EventGrid.SubscriptionValidationEvent"
 
 @app.function_name(name="warehouse_database")
 @app.event_grid_trigger(arg_name="event")
+@instrumented("trigger.warehouse_database")
 def main(event: func.EventGridEvent):
-    logging.info("Event received")
+    log.debug("Event received", id=event.id)
         
     # Parse event data
     event_data = event.get_json()
     
     if event_data:
-        process_event(event_data)
+        # A redelivered event must not reserve stock or publish again
+        keys = event_keys(event.id, event_data.get('order_id'), event_data.get('Status'))
+        if not get_deduplicator().claim(keys):
+            increment("dedup.skipped.warehouse_database")
+            log.info("Duplicate event skipped", id=event.id, order_id=event_data.get('order_id'))
+            return
+        try:
+            process_event(event_data)
+        except Exception:
+            # Let Event Grid's retry through the deduplicator
+            get_deduplicator().forget(keys)
+            raise
 
 def process_event(event_data):
     try:
@@ -43,72 +95,244 @@ def process_event(event_data):
         status = event_data.get('Status')
         driver_location = event_data.get('driverLocation',{})
 
-        logging.info(f"Order ID: {order_id}")
-        logging.info(f"Field Service ID: {field_service_id}")
-        logging.info(f"Materials: {materials}")
-        logging.info(f"Delivery Address: {delivery_address}")
-        logging.info(f"Status: {status}")
-        logging.info(f"Driver Location: {driver_location}")
-
-        # Check inventory
-        if check_inventory(materials):
-            logging.info("All materials are available")
-            logging.info(event_data)
-            event = {
-            "id": str(uuid.uuid4()),
-            "eventType": "orderConfirmed",
-            "subject": "NewOrder",
-            "eventTime": datetime.utcnow().isoformat(),
-            "data": {
-                "order_id": order_id,
-                "fieldServiceId": field_service_id,
-                "Material": materials,
-                "delivery_address": delivery_address,
-                "Status":'ready_for_pickup',
-                "driverLocation": driver_location
-            },
-            "dataVersion": "1.0"
-            }
-            logging.info(event)
-            headers = {'aeg-sas-key': EVENT_GRID_KEY}
-            response = requests.post(EVENT_GRID_ENDPOINT, json=[event], headers=headers)
-            logging.info(response)
-            print(response)
+        log.info(
+            "Order received",
+            order_id=order_id,
+            field_service_id=field_service_id,
+            status=status,
+            materials=LazyJson(materials),
+        )
+        log.debug("Order details", order_id=order_id, delivery_address=delivery_address,
+                  driver_location=LazyJson(driver_location))
+
+        error = validate_materials(materials)
+        if error is not None:
+            log.warning("Rejected order", order_id=order_id, error=error)
+            return
+
+        # Check inventory; a short order joins the backorder queue, which
+        # may still fill it if stock arrived since the check
+        if check_inventory(materials) or backorders.add(event_data):
+            log.info("All materials are available", order_id=order_id)
+            event = build_status_event(event_data, 'ready_for_pickup')
+            log.debug("Status event", event=LazyJson(event))
+            try:
+                send_to_event_grid(event)
+            except Exception:
+                # The confirmation never left, so give the stock back
+                inventory.release(materials)
+                raise
             
         else:
-            logging.info("Materials are not available")
-            event = {
-            "id": str(uuid.uuid4()),
-            "eventType": "orderConfirmed",
-            "subject": "NewOrder",
-            "eventTime": datetime.utcnow().isoformat(),
-            "data": {
-                "order_id": order_id,
-                "fieldServiceId": field_service_id,
-                "Material": materials,
-                "delivery_address": delivery_address,
-                "Status": 'pending_inventory',
-                "driverLocation": driver_location
-            },
-            "dataVersion": "1.0"
-            }
-            logging.info(event)
-            headers = {'aeg-sas-key': EVENT_GRID_KEY}
-            response = requests.post(EVENT_GRID_ENDPOINT, json=[event], headers=headers)
-            logging.info(response)
-            print(response)
-
-        # Send an event to the Event Grid
-        
+            log.info("Materials are not available", order_id=order_id)
+            event = build_status_event(event_data, 'pending_inventory')
+            log.debug("Status event", event=LazyJson(event))
+            try:
+                send_to_event_grid(event)
+            except Exception:
+                # Unqueue the order so the redelivered event starts over;
+                # if a restock released it meanwhile it is handled already
+                if backorders.remove(order_id):
+                    raise
+                log.info("Backorder released before its pending event was sent", order_id=order_id)
 
     except Exception as e:
-        logging.error(f"Error processing event: {str(e)}")
+        # Fail the invocation so Event Grid redelivers the event
+        log.error("Error processing event", error=str(e))
+        raise
+
+def send_to_event_grid(event):
+    response = get_publisher(EVENT_GRID_ENDPOINT, EVENT_GRID_KEY).publish(event).result()
+    log.debug("Event Grid response", order_id=event["data"]["order_id"], status=response.status_code)
+    if response.status_code != 200:
+        raise RuntimeError(f"Event Grid returned {response.status_code}")
+
+# Batch path: an Event Grid webhook subscription with maxEventsPerBatch set
+# delivers arrays of events here, so a burst of orders shares one invocation,
+# one inventory pass and one outbound post.
+@app.function_name(name="warehouse_database_batch")
+@app.route(route="warehouse_batch", methods=["POST"])
+@instrumented("trigger.warehouse_database_batch")
+def main_batch(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        events = loads(req.get_body())
+    except (JSONDecodeError, ValueError):
+        return func.HttpResponse("Invalid JSON body.", status_code=400)
+    if isinstance(events, dict):
+        events = [events]
+    if not isinstance(events, list):
+        return func.HttpResponse("Expected an array of events.", status_code=400)
+
+    for event in events:
+        if isinstance(event, dict) and event.get("eventType") == SUBSCRIPTION_VALIDATION_EVENT:
+            validation_code = (event.get("data") or {}).get("validationCode")
+            return func.HttpResponse(
+                dumps({"validationResponse": validation_code}),
+                status_code=200,
+                mimetype="application/json"
+            )
+
+    confirmed, pending, failed = process_events(events)
+    # A non-2xx makes Event Grid redeliver the batch; the orders that went
+    # through are dropped as duplicates then, the failed ones retried
+    return func.HttpResponse(
+        dumps({"ready_for_pickup": confirmed, "pending_inventory": pending, "failed": failed}),
+        status_code=500 if failed else 200,
+        mimetype="application/json"
+    )
+
+def process_events(events):
+    # Orders are decided oldest first (eventTime, then id) so competing
+    # reservations resolve the same way however the batch was assembled.
+    # Repeated ids, in this batch or earlier ones, are dropped by the
+    # deduplicator.
+    claimed = []
+    try:
+        return reserve_and_publish(events, claimed)
+    except Exception:
+        # Give back every claim so the redelivered batch is processed again
+        for keys in claimed:
+            get_deduplicator().forget(keys)
+        raise
+
+def reserve_and_publish(events, claimed):
+    orders = []
+    for event in sorted(
+        (e for e in events if isinstance(e, dict)),
+        key=lambda e: (str(e.get("eventTime", "")), str(e.get("id", "")))
+    ):
+        event_data = event.get("data")
+        if not isinstance(event_data, dict):
+            continue
+        keys = event_keys(event.get("id"), event_data.get("order_id"), event_data.get("Status"))
+        if not get_deduplicator().claim(keys):
+            increment("dedup.skipped.warehouse_database_batch")
+            continue
+        claimed.append(keys)
+        error = validate_materials(event_data.get("Material", []))
+        if error is not None:
+            log.warning("Rejected order", order_id=event_data.get('order_id'), error=error)
+            continue
+        orders.append((event_data, keys))
+
+    reserved = inventory.reserve_many([order.get("Material", []) for order, _ in orders])
+    reserved = [ok or backorders.add(order) for (order, _), ok in zip(orders, reserved)]
+    outgoing = [
+        build_status_event(order, 'ready_for_pickup' if ok else 'pending_inventory')
+        for (order, _), ok in zip(orders, reserved)
+    ]
+    futures = get_publisher(EVENT_GRID_ENDPOINT, EVENT_GRID_KEY).publish_many(outgoing)
+
+    confirmed = []
+    pending = []
+    failed = []
+    for (order, keys), ok, future in zip(orders, reserved, futures):
+        try:
+            sent = future.result().status_code == 200
+        except Exception:
+            sent = False
+        if sent:
+            (confirmed if ok else pending).append(order.get("order_id"))
+            continue
+        if ok:
+            # The confirmation never left, so give the stock back
+            inventory.release(order.get("Material", []))
+        elif not backorders.remove(order.get("order_id")):
+            # Released by a restock in between, which sent ready_for_pickup
+            pending.append(order.get("order_id"))
+            continue
+        # Not processed: let the redelivered batch through for this order
+        get_deduplicator().forget(keys)
+        failed.append(order.get("order_id"))
+    log.info("Processed batch", orders=len(orders), ready=len(confirmed), pending=len(pending),
+             failed=len(failed))
+    return confirmed, pending, failed
+
+# Restock: body {"Material": [{"material_id": ..., "quantity": ...}, ...]}.
+# Adds the stock and releases the backorders it fills as ready_for_pickup,
+# all in one batch of events.
+@app.function_name(name="restock")
+@app.route(route="restock", methods=["POST"])
+@instrumented("trigger.restock")
+def restock(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        body = loads(req.get_body())
+    except (JSONDecodeError, ValueError):
+        return func.HttpResponse("Invalid JSON body.", status_code=400)
+    materials = body.get("Material") if isinstance(body, dict) else None
+    error = validate_materials(materials)
+    if error is not None:
+        return func.HttpResponse(error, status_code=400)
+
+    released = backorders.restock(order_quantities(materials))
+    sent, failed = publish_released(released)
+    log.info("Restocked", materials=LazyJson(materials), released=len(sent), failed=len(failed),
+             waiting=len(backorders))
+    return func.HttpResponse(
+        dumps({"released": sent, "failed": failed, "waiting": len(backorders)}),
+        status_code=200,
+        mimetype="application/json"
+    )
+
+def publish_released(released):
+    # Returns (sent order ids, failed order ids). A failed confirmation
+    # gives its stock back and the order returns to the queue.
+    events = [build_status_event(backorder.order, 'ready_for_pickup') for backorder in released]
+    futures = get_publisher(EVENT_GRID_ENDPOINT, EVENT_GRID_KEY).publish_many(events)
+    sent = []
+    failed = []
+    for backorder, future in zip(released, futures):
+        try:
+            ok = future.result().status_code == 200
+        except Exception:
+            ok = False
+        if ok:
+            sent.append(backorder.order_id)
+        else:
+            inventory.release(backorder.materials)
+            backorders.requeue(backorder)
+            failed.append(backorder.order_id)
+    return sent, failed
+
+def build_status_event(event_data, status):
+    return {
+        "id": str(uuid.uuid4()),
+        "eventType": "orderConfirmed",
+        "subject": "NewOrder",
+        "eventTime": datetime.utcnow().isoformat(),
+        "data": {
+            "order_id": event_data.get('order_id'),
+            "fieldServiceId": event_data.get('fieldServiceId'),
+            "Material": event_data.get('Material', []),
+            "delivery_address": event_data.get('delivery_address'),
+            "Status": status,
+            "driverLocation": event_data.get('driverLocation', {})
+        },
+        "dataVersion": "1.0"
+    }
+
+@app.function_name(name="metrics")
+@app.route(route="metrics", methods=["GET"])
+def metrics(req: func.HttpRequest) -> func.HttpResponse:
+    body = snapshot()
+    body["inventory"] = inventory.snapshot()
+    body["backorders"] = backorders.stats()
+    body["startup"] = startup_report()
+    body["dedup"] = get_deduplicator().stats()
+    return func.HttpResponse(dumps(body), status_code=200, mimetype="application/json")
 
 def check_inventory(materials):
-    for material in materials:
-        found = next((item for item in inventory if item["material_id"] == material["material_id"]), None)
-        if not found or found["quantity"] < material["quantity"]:
-            return False
-    return True
+    # Reserves every line of the order, or nothing if any line is short
+    return inventory.reserve(materials)
+
+
+def warm_up_steps():
+    return [
+        ("imports", lambda: preload("resilient_http", "eventgrid_publisher")),
+        ("caches", get_deduplicator),
+        ("eventgrid", lambda: get_publisher(EVENT_GRID_ENDPOINT, EVENT_GRID_KEY).warm()),
+    ]
 
 
+record("load.function_app", time.perf_counter() - _load_start)
+warm_up(warm_up_steps())
@@ -0,0 +1,82 @@
+import threading
+
+
+def order_quantities(materials):
+    # Collapse an order's Material lines into {material_id: quantity}, so an
+    # order listing the same material twice is checked against the sum
+    wanted = {}
+    for material in materials:
+        material_id = material["material_id"]
+        wanted[material_id] = wanted.get(material_id, 0) + material["quantity"]
+    return wanted
+
+
+class InventoryStore:
+    # Stock indexed by material_id. Reservations take every line of an order
+    # or none of them, under one lock, so concurrent invocations in the same
+    # worker can never both confirm the last units.
+
+    def __init__(self, items=()):
+        self._stock = {item["material_id"]: item["quantity"] for item in items}
+        self._lock = threading.Lock()
+
+    def quantity(self, material_id):
+        return self._stock.get(material_id, 0)
+
+    def is_available(self, materials):
+        wanted = order_quantities(materials)
+        with self._lock:
+            return self._available(wanted)
+
+    def shortages(self, materials):
+        # {material_id: missing quantity} for the lines that cannot be filled
+        wanted = order_quantities(materials)
+        with self._lock:
+            return {
+                material_id: quantity - self._stock.get(material_id, 0)
+                for material_id, quantity in wanted.items()
+                if self._stock.get(material_id, 0) < quantity
+            }
+
+    def reserve(self, materials):
+        wanted = order_quantities(materials)
+        with self._lock:
+            if not self._available(wanted):
+                return False
+            for material_id, quantity in wanted.items():
+                self._stock[material_id] -= quantity
+            return True
+
+    def reserve_many(self, orders):
+        # Reserve a batch of orders in the given order under one lock; each
+        # order is still all-or-nothing. Returns one bool per order.
+        wanted = [order_quantities(materials) for materials in orders]
+        results = []
+        with self._lock:
+            for quantities in wanted:
+                available = self._available(quantities)
+                if available:
+                    for material_id, quantity in quantities.items():
+                        self._stock[material_id] -= quantity
+                results.append(available)
+        return results
+
+    def release(self, materials):
+        # Give back a reservation, e.g. when the confirmation could not be sent
+        self.restock(order_quantities(materials))
+
+    def restock(self, quantities):
+        with self._lock:
+            for material_id, quantity in quantities.items():
+                self._stock[material_id] = self._stock.get(material_id, 0) + quantity
+
+    def snapshot(self):
+        with self._lock:
+            return [{"material_id": m, "quantity": q} for m, q in self._stock.items()]
+
+    def _available(self, wanted):
+        stock = self._stock
+        for material_id, quantity in wanted.items():
+            if stock.get(material_id, 0) < quantity:
+                return False
+        return True
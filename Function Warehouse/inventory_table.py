@@ -0,0 +1,214 @@
+import threading
+import time
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError
+from azure.data.tables import TableServiceClient, TableTransactionError, UpdateMode
+
+from inventory import order_quantities
+from telemetry import get_logger, increment
+
+CACHE_TTL_SECONDS = 2.0
+MAX_RETRIES = 5
+# Entity-group transactions are limited to 100 operations
+MAX_TRANSACTION_ROWS = 100
+# Table queries allow at most 15 comparisons per filter
+ROWS_PER_QUERY = 14
+
+log = get_logger(__name__)
+
+
+class TableInventoryStore:
+    # Inventory kept in Azure Table storage (or the local Azurite emulator),
+    # one entity per material_id in a single partition so an order's lines
+    # can be updated in one entity-group transaction.
+    #
+    # Reads go through a per-instance cache with a short TTL. Writes carry
+    # the ETag of the row they were computed from, so a stale cache entry or
+    # a competing instance makes the transaction fail with 412; the touched
+    # rows are then re-read and the reservation is retried.
+
+    def __init__(self, table_client, partition_key="inventory", cache_ttl=CACHE_TTL_SECONDS,
+                 max_retries=MAX_RETRIES):
+        self.table = table_client
+        self.partition_key = partition_key
+        self.cache_ttl = cache_ttl
+        self.max_retries = max_retries
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.conflicts = 0
+
+    @classmethod
+    def from_connection_string(cls, connection_string, table_name="inventory", **kwargs):
+        service = TableServiceClient.from_connection_string(connection_string)
+        table = service.create_table_if_not_exists(table_name)
+        return cls(table, **kwargs)
+
+    def seed(self, items):
+        # Create rows for items that do not exist yet; existing stock is kept
+        for item in items:
+            try:
+                self.table.create_entity({
+                    "PartitionKey": self.partition_key,
+                    "RowKey": item["material_id"],
+                    "Quantity": item["quantity"],
+                })
+            except ResourceExistsError:
+                pass
+
+    def quantity(self, material_id):
+        return self._read([material_id])[material_id][0]
+
+    def is_available(self, materials):
+        wanted = order_quantities(materials)
+        rows = self._read(wanted)
+        return all(rows[m][0] >= q for m, q in wanted.items())
+
+    def shortages(self, materials):
+        wanted = order_quantities(materials)
+        rows = self._read(wanted)
+        return {m: q - rows[m][0] for m, q in wanted.items() if rows[m][0] < q}
+
+    def reserve(self, materials):
+        wanted = order_quantities(materials)
+        return self._apply({m: -q for m, q in wanted.items()})
+
+    def reserve_many(self, orders):
+        # Decide a whole batch of orders against one fresh read, in the given
+        # order, and write the combined decrements in a single transaction.
+        wanted = [order_quantities(materials) for materials in orders]
+        material_ids = set()
+        for quantities in wanted:
+            material_ids.update(quantities)
+        if len(material_ids) > MAX_TRANSACTION_ROWS:
+            return [self.reserve(materials) for materials in orders]
+
+        for _ in range(self.max_retries):
+            rows = self._read(material_ids, fresh=True)
+            stock = {material_id: rows[material_id][0] for material_id in material_ids}
+            results = []
+            for quantities in wanted:
+                available = all(stock[m] >= q for m, q in quantities.items())
+                if available:
+                    for material_id, quantity in quantities.items():
+                        stock[material_id] -= quantity
+                results.append(available)
+            deltas = {m: stock[m] - rows[m][0] for m in material_ids if stock[m] != rows[m][0]}
+            if not deltas or self._commit(deltas, rows):
+                return results
+        raise RuntimeError("Inventory update kept conflicting; giving up")
+
+    def release(self, materials):
+        self.restock(order_quantities(materials))
+
+    def restock(self, quantities):
+        if not self._apply(quantities):
+            raise RuntimeError("Restock could not be applied")
+
+    def snapshot(self):
+        entities = self.table.query_entities(
+            "PartitionKey eq @pk", parameters={"pk": self.partition_key}
+        )
+        return [{"material_id": e["RowKey"], "quantity": e["Quantity"]} for e in entities]
+
+    def invalidate(self, material_ids=None):
+        with self._lock:
+            if material_ids is None:
+                self._cache.clear()
+            else:
+                for material_id in material_ids:
+                    self._cache.pop(material_id, None)
+
+    def _apply(self, deltas):
+        # Applies {material_id: delta} in one transaction. Returns False
+        # without writing if any row would go negative.
+        fresh = False
+        for _ in range(self.max_retries):
+            rows = self._read(deltas, fresh=fresh)
+            if any(rows[m][0] + d < 0 for m, d in deltas.items()):
+                if fresh:
+                    return False
+                # A cached row may be stale; decide on current values
+                fresh = True
+                continue
+            if self._commit(deltas, rows):
+                return True
+            fresh = True
+        raise RuntimeError("Inventory update kept conflicting; giving up")
+
+    def _commit(self, deltas, rows):
+        # Writes rows[m] + deltas[m] for every material in one transaction,
+        # conditional on the ETags in rows. Returns False on a conflict.
+        operations = []
+        for material_id, delta in deltas.items():
+            quantity, etag = rows[material_id]
+            entity = {
+                "PartitionKey": self.partition_key,
+                "RowKey": material_id,
+                "Quantity": quantity + delta,
+            }
+            if etag is None:
+                operations.append(("create", entity))
+            else:
+                operations.append(("update", entity, {
+                    "mode": UpdateMode.MERGE,
+                    "etag": etag,
+                    "match_condition": MatchConditions.IfNotModified,
+                }))
+        try:
+            results = self.table.submit_transaction(operations)
+        except TableTransactionError as e:
+            # 412: a row changed since we read it; 409: a row we meant to
+            # create was created by someone else
+            if e.status_code not in (409, 412):
+                raise
+            self.conflicts += 1
+            increment("inventory.conflicts")
+            log.info("Inventory write conflict, retrying", status=e.status_code)
+            self.invalidate(deltas)
+            return False
+        expires = time.monotonic() + self.cache_ttl
+        with self._lock:
+            for (_, entity, *_), metadata in zip(operations, results):
+                self._cache[entity["RowKey"]] = (entity["Quantity"], metadata.get("etag"), expires)
+        return True
+
+    def _read(self, material_ids, fresh=False):
+        # {material_id: (quantity, etag)}; missing rows read as (0, None)
+        now = time.monotonic()
+        rows = {}
+        missing = []
+        with self._lock:
+            for material_id in material_ids:
+                entry = None if fresh else self._cache.get(material_id)
+                if entry is not None and entry[2] > now:
+                    rows[material_id] = entry[:2]
+                    self.cache_hits += 1
+                else:
+                    missing.append(material_id)
+                    self.cache_misses += 1
+        if not missing:
+            return rows
+
+        fetched = {material_id: (0, None) for material_id in missing}
+        for start in range(0, len(missing), ROWS_PER_QUERY):
+            chunk = missing[start:start + ROWS_PER_QUERY]
+            parameters = {"pk": self.partition_key}
+            clauses = []
+            for i, material_id in enumerate(chunk):
+                parameters[f"rk{i}"] = material_id
+                clauses.append(f"RowKey eq @rk{i}")
+            query = f"PartitionKey eq @pk and ({' or '.join(clauses)})"
+            for entity in self.table.query_entities(query, parameters=parameters):
+                fetched[entity["RowKey"]] = (entity["Quantity"], entity.metadata["etag"])
+
+        expires = time.monotonic() + self.cache_ttl
+        with self._lock:
+            for material_id, row in fetched.items():
+                if row[1] is not None:
+                    self._cache[material_id] = row + (expires,)
+        rows.update(fetched)
+        return rows
+
@@ -0,0 +1,55 @@
+from fast_json import JSONDecodeError, loads
+
+REQUIRED_FIELDS = ("order_id", "fieldServiceId", "Material", "delivery_address", "Status")
+_REQUIRED = frozenset(REQUIRED_FIELDS)
+_MATERIAL_FIELDS = frozenset(("material_id", "quantity"))
+
+
+def unwrap_order(body):
+    # Orders arrive either as the bare order or wrapped in an Event Grid
+    # style {"data": {...}} envelope
+    if isinstance(body, dict) and "data" in body:
+        return body["data"]
+    return body
+
+
+def validate_order(order):
+    # Returns None for a valid order, otherwise the reason it was rejected
+    if not isinstance(order, dict):
+        return "Order must be a JSON object."
+    if not _REQUIRED.issubset(order.keys()):
+        for field in REQUIRED_FIELDS:
+            if field not in order:
+                return f"Missing required field: {field}"
+    return validate_materials(order["Material"])
+
+
+def validate_materials(materials):
+    if not isinstance(materials, list):
+        return "Invalid format for 'Material'. It should be a list of dictionaries."
+    for i, item in enumerate(materials):
+        if type(item) is not dict:
+            return "Invalid format for 'Material'. It should be a list of dictionaries."
+        if not _MATERIAL_FIELDS.issubset(item.keys()):
+            return f"Invalid Material line {i}: 'material_id' and 'quantity' are required."
+        material_id = item["material_id"]
+        quantity = item["quantity"]
+        if type(material_id) is not str or not material_id:
+            return f"Invalid Material line {i}: 'material_id' must be a non-empty string."
+        if type(quantity) is not int or quantity <= 0:
+            return f"Invalid Material line {i}: 'quantity' must be a positive integer."
+    return None
+
+
+def parse_order_body(body):
+    # Decode and validate a raw request body in one step.
+    # Returns (order, None) or (None, reason).
+    try:
+        decoded = loads(body)
+    except (JSONDecodeError, ValueError, TypeError):
+        return None, "Invalid JSON body."
+    order = unwrap_order(decoded)
+    error = validate_order(order)
+    if error is not None:
+        return None, error
+    return order, None
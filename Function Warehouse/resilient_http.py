@@ -0,0 +1,262 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from telemetry import get_logger, increment, timed
+
+# Statuses worth another attempt; anything else (including 4xx) is returned
+RETRY_STATUSES = frozenset((408, 429, 500, 502, 503, 504))
+
+# Per-endpoint settings, each overridable from the app settings as
+# <NAME>_<SETTING>, e.g. MAPS_READ_TIMEOUT=3 or MAPS_HEDGE_AFTER=0.3.
+# deadline bounds a call including all retries and backoff; hedge_after > 0
+# sends a second copy of a GET that has not answered after that many seconds.
+ENDPOINT_DEFAULTS = {
+    "maps": {
+        "connect_timeout": 3.05,
+        "read_timeout": 5.0,
+        "retries": 2,
+        "backoff": 0.2,
+        "max_backoff": 2.0,
+        "deadline": 10.0,
+        "hedge_after": 0.0,
+        "failure_threshold": 5,
+        "reset_timeout": 30.0,
+    },
+    "eventgrid": {
+        "connect_timeout": 3.05,
+        "read_timeout": 10.0,
+        "retries": 3,
+        "backoff": 0.2,
+        "max_backoff": 5.0,
+        "deadline": 30.0,
+        "hedge_after": 0.0,
+        "failure_threshold": 5,
+        "reset_timeout": 15.0,
+    },
+}
+
+log = get_logger(__name__)
+
+
+def endpoint_settings(name):
+    settings = dict(ENDPOINT_DEFAULTS.get(name, ENDPOINT_DEFAULTS["maps"]))
+    for setting, default in settings.items():
+        value = os.environ.get(f"{name.upper()}_{setting.upper()}")
+        if value is not None:
+            settings[setting] = type(default)(value)
+    return settings
+
+
+def backoff_delay(attempt, base, cap):
+    # Full jitter: uniform in [0, min(cap, base * 2 ** attempt)]
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    # Opens after failure_threshold consecutive failures and then rejects
+    # calls for reset_timeout seconds, so a dead upstream costs callers
+    # nothing instead of a timeout each. After that one trial call is let
+    # through; its outcome closes or re-opens the circuit.
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._trial_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if self._trial else "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at < self.reset_timeout:
+                return False
+            # A trial whose outcome never got recorded expires as well, so
+            # the circuit cannot stay half-open for good
+            if self._trial and now - self._trial_at < self.reset_timeout:
+                return False
+            self._trial = True
+            self._trial_at = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial:
+                    self._opened_at = time.monotonic()
+                self._trial = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    # One breaker per upstream, shared by the sync and async clients
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            settings = endpoint_settings(name)
+            breaker = CircuitBreaker(settings["failure_threshold"], settings["reset_timeout"])
+            _breakers[name] = breaker
+        return breaker
+
+
+class ResilientClient:
+    # requests.Session wrapper: pooled connections, connect/read timeouts,
+    # retries with jittered exponential backoff inside an overall deadline,
+    # a circuit breaker, and optional hedging of GETs.
+
+    def __init__(self, name, breaker=None, pool_maxsize=20, headers=None, **overrides):
+        settings = endpoint_settings(name)
+        settings.update(overrides)
+        self.name = name
+        self.timeout = (settings["connect_timeout"], settings["read_timeout"])
+        self.retries = int(settings["retries"])
+        self.backoff = settings["backoff"]
+        self.max_backoff = settings["max_backoff"]
+        self.deadline = settings["deadline"]
+        self.hedge_after = settings["hedge_after"]
+        self.breaker = breaker or get_breaker(name)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+        self._pool_maxsize = pool_maxsize
+        self._hedge_executor = None
+        self._hedge_lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        # Returns the last response (possibly an error status), or raises
+        # the last connection error / timeout, or CircuitOpenError
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                increment(f"http.{self.name}.rejected")
+                raise CircuitOpenError(f"{self.name} circuit is open")
+            # A backoff sleep can overshoot; urllib3 rejects timeouts <= 0
+            remaining = max(deadline - time.monotonic(), 0.001)
+            timeout = (min(self.timeout[0], remaining), min(self.timeout[1], remaining))
+            response = None
+            try:
+                with timed(f"http.{self.name}"):
+                    if method == "GET" and self.hedge_after > 0:
+                        response = self._hedged(method, url, timeout, kwargs)
+                    else:
+                        response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except requests.RequestException as e:
+                self.breaker.record_failure()
+                error = e
+            except BaseException:
+                # Anything else still settles a half-open trial
+                self.breaker.record_failure()
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return response
+                self.breaker.record_failure()
+
+            attempt += 1
+            delay = backoff_delay(attempt, self.backoff, self.max_backoff)
+            retry_after = response.headers.get("Retry-After") if response is not None else None
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, min(float(retry_after), self.max_backoff))
+            if attempt > self.retries or time.monotonic() + delay >= deadline:
+                if response is not None:
+                    return response
+                raise error
+            increment(f"http.{self.name}.retries")
+            log.debug("Retrying request", upstream=self.name, attempt=attempt,
+                      status=response.status_code if response is not None else None)
+            time.sleep(delay)
+
+    def warm(self, url):
+        # Opens a pooled connection (DNS, TCP, TLS) ahead of the first real
+        # call. Any answer will do and failures are not held against the
+        # breaker; the real call will find out soon enough.
+        try:
+            self.session.head(url, timeout=self.timeout)
+        except requests.RequestException as e:
+            log.debug("Warm-up request failed", upstream=self.name, error=str(e))
+
+    def close(self):
+        self.session.close()
+        if self._hedge_executor is not None:
+            self._hedge_executor.shutdown(wait=False)
+
+    def _hedged(self, method, url, timeout, kwargs):
+        # First answer wins; the slower copy finishes in the background
+        executor = self._executor()
+        futures = [executor.submit(self.session.request, method, url, timeout=timeout, **kwargs)]
+        done, _ = wait(futures, timeout=self.hedge_after)
+        if not done:
+            increment(f"http.{self.name}.hedged")
+            futures.append(executor.submit(self.session.request, method, url, timeout=timeout, **kwargs))
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except requests.RequestException as e:
+                    error = e
+        raise error
+
+    def _executor(self):
+        with self._hedge_lock:
+            if self._hedge_executor is None:
+                # Room for every caller's first attempt plus its hedge
+                self._hedge_executor = ThreadPoolExecutor(max_workers=2 * self._pool_maxsize,
+                                                          thread_name_prefix=f"{self.name}-hedge")
+            return self._hedge_executor
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name):
+    with _clients_lock:
+        client = _clients.get(name)
+        if client is None:
+            client = _clients[name] = ResilientClient(name)
+        return client
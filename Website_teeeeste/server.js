@@ -14,6 +14,30 @@ app.use((req, res, next) => {
 });
 
 let initialRouteData = new Map();
+// Last DriverLocation position per order, in micro-degrees
+let lastPositions = new Map();
+
+// DriverLocation events carry either an absolute position (lat/lon) or a
+// delta from the previous seq (dlat/dlon, micro-degrees). A delta that does
+// not follow the last applied seq is dropped until the next absolute one.
+function applyLocationUpdate(update) {
+    const last = lastPositions.get(update.order_id);
+    if (last && update.seq <= last.seq) {
+        return null;
+    }
+    let lat, lon;
+    if (update.lat !== undefined && update.lon !== undefined) {
+        lat = Math.round(update.lat * 1e6);
+        lon = Math.round(update.lon * 1e6);
+    } else if (last && update.seq === last.seq + 1) {
+        lat = last.lat + update.dlat;
+        lon = last.lon + update.dlon;
+    } else {
+        return null;
+    }
+    lastPositions.set(update.order_id, { seq: update.seq, lat: lat, lon: lon });
+    return { latitude: String(lat / 1e6), longitude: String(lon / 1e6) };
+}
 
 app.post('/eventgrid', (req, res) => {
     console.log('Received request to /eventgrid');
@@ -44,6 +68,18 @@ app.post('/eventgrid', (req, res) => {
                 console.log('Emitting route update:', JSON.stringify({ driverLocation: routeData, version: "1.1", order_id: orderId }, null, 2));
                 io.emit('routeUpdate', { driverLocation: routeData, version: "1.1", order_id: orderId });
             }
+        } else if (event.eventType === 'DriverLocation') {
+            const orderId = event.data.order_id;
+            const initial = initialRouteData.get(orderId);
+            const currentLocation = applyLocationUpdate(event.data);
+            if (initial && currentLocation) {
+                const routeData = {
+                    currentLocation: currentLocation,
+                    destination: initial.driverLocation.destination,
+                    eventType: 'RouteData'
+                };
+                io.emit('routeUpdate', { driverLocation: routeData, version: "1.1", order_id: orderId });
+            }
         } else {
             console.log(`Unhandled event type: ${event.eventType}`);
         }
@@ -57,6 +93,7 @@ app.post('/reset', (req, res) => {
     const orderId = req.body.order_id;
     if (orderId) {
         initialRouteData.delete(orderId);
+        lastPositions.delete(orderId);
         io.emit('reset', orderId);
         res.sendStatus(200);
     } else {
@@ -66,6 +103,7 @@ app.post('/reset', (req, res) => {
 
 app.post('/reset-all', (req, res) => {
     initialRouteData.clear();
+    lastPositions.clear();
     io.emit('reset-all');
     res.sendStatus(200);
 });
@@ -0,0 +1,80 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Function Warehouse"))
+
+from backorders import BackorderQueue  # noqa: E402
+from inventory import InventoryStore  # noqa: E402
+
+# --pending orders waiting on an empty warehouse of --materials SKUs, then
+# --restocks deliveries of one SKU each. The backorder queue only looks at
+# the orders short on the restocked SKU; the baseline rescans every pending
+# order in FIFO order, as resubmitting the backlog would. Both must release
+# the same orders.
+
+
+def make_orders(count, materials, rng):
+    return [
+        {
+            "order_id": f"order-{i}",
+            "Material": [{"material_id": f"sku-{rng.randrange(materials)}", "quantity": rng.randint(1, 3)}
+                         for _ in range(rng.randint(1, 3))],
+        }
+        for i in range(count)
+    ]
+
+
+def rescan(inventory, pending, quantities):
+    # Baseline: every pending order, oldest first
+    inventory.restock(quantities)
+    reserved = inventory.reserve_many([order["Material"] for order in pending])
+    released = [order["order_id"] for order, ok in zip(pending, reserved) if ok]
+    pending[:] = [order for order, ok in zip(pending, reserved) if not ok]
+    return released
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pending", type=int, default=100000)
+    parser.add_argument("--materials", type=int, default=2000)
+    parser.add_argument("--restocks", type=int, default=500)
+    parser.add_argument("--quantity", type=int, default=100, help="units per restock")
+    parser.add_argument("--policy", choices=("fifo", "priority"), default="fifo")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    orders = make_orders(args.pending, args.materials, rng)
+    restocks = [{f"sku-{rng.randrange(args.materials)}": args.quantity} for _ in range(args.restocks)]
+
+    queue = BackorderQueue(InventoryStore(), policy=args.policy)
+    start = time.perf_counter()
+    for order in orders:
+        queue.add(order)
+    print(f"queued {len(queue)} orders on {args.materials} SKUs in {time.perf_counter() - start:.2f}s")
+
+    baseline_inventory = InventoryStore()
+    pending = list(orders)
+
+    indexed_time = 0.0
+    rescan_time = 0.0
+    indexed_released = 0
+    for quantities in restocks:
+        start = time.perf_counter()
+        released = [backorder.order_id for backorder in queue.restock(quantities)]
+        indexed_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = rescan(baseline_inventory, pending, quantities)
+        rescan_time += time.perf_counter() - start
+
+        if args.policy == "fifo":
+            assert sorted(released) == sorted(expected), (released, expected)
+        indexed_released += len(released)
+
+    print(f"{args.restocks} restocks, {indexed_released} orders released, {len(queue)} still waiting")
+    print(f"rescan all pending  {rescan_time / args.restocks * 1000:9.3f} ms per restock")
+    print(f"backorder index     {indexed_time / args.restocks * 1000:9.3f} ms per restock "
+          f"({rescan_time / indexed_time:.0f}x)")
@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import azure.functions as func
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_order_lifecycle import configure, flush_publishers, make_orders  # noqa: E402
+from fake_azure import start_server  # noqa: E402
+from order_app import load_order_app, quiet  # noqa: E402
+
+# An ERP import of --orders orders (a share of them invalid) placed one
+# request per order through http_trigger on a thread pool, against one
+# bulk_orders request with the same orders as NDJSON and as a JSON array.
+# Reports orders/s, Event Grid posts and the peak memory the request
+# allocates, next to decoding the whole array up front as get_json() would.
+
+
+def make_body(orders, invalid_every, array):
+    # Every invalid_every-th order is missing its required fields
+    lines = [
+        json.dumps({"order_id": order["order_id"]} if invalid_every and i % invalid_every == invalid_every - 1
+                   else order)
+        for i, order in enumerate(orders)
+    ]
+    if array:
+        return ("[\n" + ",\n".join(lines) + "\n]").encode("utf-8")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def raw_request(body, route):
+    return func.HttpRequest(method="POST", url=f"http://localhost/api/{route}", body=body,
+                            headers={"Content-Type": "application/json"})
+
+
+def run(name, server, call):
+    before = (server.state.requests, server.state.events)
+    start = time.perf_counter()
+    with quiet():
+        accepted = call()
+        flush_publishers()
+    elapsed = time.perf_counter() - start
+    posts = server.state.requests - before[0]
+    events = server.state.events - before[1]
+    print(f"{name:<22} {elapsed:6.2f}s  {accepted / elapsed:8.0f} orders/s  {accepted:>6} accepted  "
+          f"{events:>6} events  {posts:>5} posts")
+
+
+def peak_memory(call):
+    tracemalloc.start()
+    with quiet():
+        call()
+        flush_publishers()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--invalid-every", type=int, default=100, help="every n-th line is invalid")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated Event Grid latency (s)")
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency)
+    configure(server, 0.001)
+    app = load_order_app()
+
+    orders = make_orders(args.orders, 200)
+    ndjson = make_body(orders, args.invalid_every, array=False)
+    array = make_body(orders, args.invalid_every, array=True)
+    print(f"{args.orders} orders, NDJSON {len(ndjson) / 1024 / 1024:.1f} MB, array {len(array) / 1024 / 1024:.1f} MB")
+
+    def one_by_one():
+        lines = ndjson.splitlines()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            statuses = list(pool.map(lambda line: app.http_trigger(raw_request(line, "http_trigger")).status_code,
+                                     lines))
+        return statuses.count(200)
+
+    def bulk(body):
+        response = app.bulk_orders(raw_request(body, "bulk_orders"))
+        assert response.status_code == 200, response.get_body()
+        return json.loads(response.get_body())["accepted"]
+
+    run("http_trigger per order", server, one_by_one)
+    run("bulk_orders NDJSON", server, lambda: bulk(ndjson))
+    run("bulk_orders array", server, lambda: bulk(array))
+
+    print("peak memory allocated while handling the request:")
+    print(f"  decode whole array      {peak_memory(lambda: json.loads(array)):6.1f} MB  (get_json(), before any work)")
+    print(f"  bulk_orders NDJSON      {peak_memory(lambda: bulk(ndjson)):6.1f} MB")
+    print(f"  bulk_orders array       {peak_memory(lambda: bulk(array)):6.1f} MB")
+    server.shutdown()
@@ -0,0 +1,129 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+START = time.perf_counter()
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Cold start of each app in a fresh interpreter per run, like a new worker
+# process on the Functions host: time to load function_app (the host has
+# already imported azure.functions by then), then the latency of the first
+# and second invocation of a trigger, which is where deferred imports,
+# unopened connections and empty caches show up. Compares STARTUP_WARMUP
+# off, background and blocking; --gap is the pause between load and the
+# first invocation (the host finishing its own startup).
+#
+#   place    Order http_trigger       -> Event Grid
+#   deliver  Order event_grid_trigger -> Maps geocode + route, Event Grid
+#   reserve  Warehouse main           -> Event Grid
+
+SCENARIOS = ("place", "deliver", "reserve")
+MODES = ("off", "background", "blocking")
+
+
+def order_body(i):
+    return {
+        "order_id": f"cold-{i}",
+        "fieldServiceId": "fs-1",
+        "Material": [{"material_id": "cimento", "quantity": 1}],
+        "delivery_address": f"Rua Direita {i}, Coimbra",
+        "Status": "pending_warehouse",
+    }
+
+
+def status_event(i, status):
+    return {
+        "id": f"cold-event-{i}",
+        "eventType": "orderConfirmed",
+        "subject": "NewOrder",
+        "eventTime": "2024-06-01T12:00:00",
+        "data": dict(order_body(i), Status=status),
+        "dataVersion": "1.0",
+    }
+
+
+def child(scenario, gap):
+    # order_app imports azure.functions, so it is loaded before the clock
+    # starts, as the host has it loaded before the app
+    from order_app import load_order_app, load_warehouse_app, make_event, make_request, quiet
+
+    ready = time.perf_counter()
+    with quiet():
+        app = load_warehouse_app() if scenario == "reserve" else load_order_app()
+    loaded = time.perf_counter()
+    time.sleep(gap)
+
+    def invoke(i):
+        start = time.perf_counter()
+        with quiet():
+            if scenario == "place":
+                response = app.http_trigger(make_request(order_body(i)))
+                assert response.status_code == 200, response.get_body()
+            elif scenario == "deliver":
+                app.event_grid_trigger(make_event(status_event(i, "ready_for_pickup")))
+            else:
+                app.main(make_event(status_event(i, "waiting_for_warehouse")))
+        return (time.perf_counter() - start) * 1000
+
+    first = invoke(0)
+    second = invoke(1)
+    print(json.dumps({
+        "interpreter_ms": (ready - START) * 1000,
+        "load_ms": (loaded - ready) * 1000,
+        "first_ms": first,
+        "second_ms": second,
+    }))
+
+
+def run_child(scenario, mode, gap, env):
+    env = dict(env, STARTUP_WARMUP=mode)
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", scenario, "--gap", str(gap)],
+        env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=7, help="fresh processes per scenario and mode")
+    parser.add_argument("--gap", type=float, default=0.3, help="pause between load and first invocation (s)")
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated Event Grid latency (s)")
+    parser.add_argument("--maps-latency", type=float, default=0.02, help="simulated Azure Maps latency (s)")
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.gap)
+        sys.exit(0)
+
+    from fake_azure import server_url, start_server
+
+    server = start_server(latency=args.latency, maps_latency=args.maps_latency)
+    env = dict(
+        os.environ,
+        ORDER_EVENT_GRID_ENDPOINT=server_url(server, "/order/api/events"),
+        STATUS_EVENT_GRID_ENDPOINT=server_url(server, "/status/api/events"),
+        WAREHOUSE_EVENT_GRID_ENDPOINT=server_url(server, "/warehouse/api/events"),
+        AZURE_MAPS_URL=server_url(server, ""),
+        GEOCODE_CACHE_PATH="",
+        INVENTORY_TABLE_CONNECTION="",
+        DEDUP_TABLE_CONNECTION="",
+        ROUTE_PLAYBACK_MODE="scheduled",
+        ROUTE_UPDATE_INTERVAL="0.001",
+    )
+
+    print(f"{args.runs} runs each, medians, gap {args.gap * 1000:.0f} ms before the first invocation")
+    for scenario in SCENARIOS:
+        for mode in MODES:
+            runs = [run_child(scenario, mode, args.gap, env) for _ in range(args.runs)]
+            median = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+            print(f"{scenario:<8} {mode:<11} load {median['load_ms']:7.1f} ms  "
+                  f"first {median['first_ms']:7.1f} ms  second {median['second_ms']:6.1f} ms  "
+                  f"load + first {median['load_ms'] + median['first_ms']:7.1f} ms")
+    server.shutdown()
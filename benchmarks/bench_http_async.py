@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_azure import server_url, start_server  # noqa: E402
+from order_app import load_http_function, make_request, quiet  # noqa: E402
+
+# Load test for the order endpoint: the blocking handler on a fixed worker
+# thread pool (as the Functions host runs sync functions) against the async
+# handler on one event loop, both under the same number of concurrent
+# clients. Every order has a new address, so geocode and route calls really
+# go out to the local Azure Maps stand-in.
+
+
+def make_orders(count, status):
+    return [
+        {
+            "order_id": f"order-{i}",
+            "fieldServiceId": "fs-1",
+            "Material": [{"material_id": "cimento", "quantity": 1}],
+            "delivery_address": f"Rua Direita {i}, Coimbra",
+            "Status": status,
+        }
+        for i in range(count)
+    ]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def report(name, latencies, elapsed):
+    print(f"{name:<28} {len(latencies) / elapsed:>8.0f} req/s  "
+          f"p50 {percentile(latencies, 50) * 1000:7.1f} ms  p99 {percentile(latencies, 99) * 1000:7.1f} ms")
+
+
+def reset_caches(http_function):
+    from order_app_pkg.geocoding import GeocodeCache
+    from order_app_pkg.routing import RouteCache
+    http_function.get_geocode_cache = lambda cache=GeocodeCache(path=None): cache
+    http_function.get_route_cache = lambda cache=RouteCache(): cache
+
+
+def run_sync(http_function, orders, threads, clients):
+    reset_caches(http_function)
+    latencies = []
+
+    def call(order):
+        start = time.perf_counter()
+        response = http_function.main(make_request(order))
+        assert response.status_code == 200, response.get_body()
+        return time.perf_counter() - start
+
+    # clients submit at once; only `threads` handlers run at a time
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for i in range(0, len(orders), clients):
+            submitted = time.perf_counter()
+            futures = [pool.submit(call, order) for order in orders[i:i + clients]]
+            for future in futures:
+                future.result()
+                latencies.append(time.perf_counter() - submitted)
+    return latencies, time.perf_counter() - start
+
+
+async def run_async(http_function, orders, clients):
+    reset_caches(http_function)
+    latencies = []
+
+    async def call(order):
+        start = time.perf_counter()
+        response = await http_function.main_async(make_request(order, "http_trigger_async"))
+        assert response.status_code == 200, response.get_body()
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(0, len(orders), clients):
+        await asyncio.gather(*(call(order) for order in orders[i:i + clients]))
+    elapsed = time.perf_counter() - start
+    from order_app_pkg.async_http import close_sessions
+    await close_sessions()
+    return latencies, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=200, help="concurrent requests")
+    parser.add_argument("--threads", type=int, default=16, help="worker threads for the sync handler")
+    parser.add_argument("--latency", type=float, default=0.02, help="simulated upstream latency (s)")
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency)
+    http_function = load_http_function()
+    http_function.AZURE_MAPS_URL = server_url(server, "")
+    http_function.EVENT_GRID_ENDPOINT = server_url(server)
+
+    for status in ("ready_to_pickup", "pending_warehouse"):
+        orders = make_orders(args.requests, status)
+        with quiet():
+            sync_result = run_sync(http_function, orders, args.threads, args.clients)
+            async_result = asyncio.run(run_async(http_function, orders, args.clients))
+        report(f"sync  {status}", *sync_result)
+        report(f"async {status}", *async_result)
+    server.shutdown()
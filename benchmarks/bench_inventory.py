@@ -0,0 +1,72 @@
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Function Warehouse"))
+
+from inventory import InventoryStore  # noqa: E402
+
+# Compares the previous linear-scan check_inventory with the indexed
+# InventoryStore on a large catalog, then checks that concurrent reservations
+# never oversell.
+
+
+def linear_check(inventory, materials):
+    for material in materials:
+        found = next((item for item in inventory if item["material_id"] == material["material_id"]), None)
+        if not found or found["quantity"] < material["quantity"]:
+            return False
+    return True
+
+
+def make_orders(skus, count, lines):
+    return [
+        [{"material_id": f"sku-{random.randrange(skus)}", "quantity": 1} for _ in range(lines)]
+        for _ in range(count)
+    ]
+
+
+def bench(name, func, orders):
+    start = time.perf_counter()
+    for materials in orders:
+        func(materials)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<22} {len(orders) / elapsed:>12.0f} orders/s")
+
+
+def oversell_check(threads, orders_per_thread):
+    store = InventoryStore([{"material_id": "last-units", "quantity": 100}])
+    confirmed = []
+
+    def worker():
+        count = 0
+        for _ in range(orders_per_thread):
+            if store.reserve([{"material_id": "last-units", "quantity": 1}]):
+                count += 1
+        confirmed.append(count)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    print(f"concurrent reservations: {sum(confirmed)} confirmed for 100 units, "
+          f"{store.quantity('last-units')} left")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--skus", type=int, default=100000)
+    parser.add_argument("--orders", type=int, default=200, help="orders for the linear scan")
+    parser.add_argument("--lines", type=int, default=5, help="Material lines per order")
+    args = parser.parse_args()
+
+    items = [{"material_id": f"sku-{i}", "quantity": 1000000} for i in range(args.skus)]
+    store = InventoryStore(items)
+    bench("linear scan (check)", lambda m: linear_check(items, m), make_orders(args.skus, args.orders, args.lines))
+    bench("indexed (check)", store.is_available, make_orders(args.skus, args.orders * 500, args.lines))
+    bench("indexed (reserve)", store.reserve, make_orders(args.skus, args.orders * 500, args.lines))
+    oversell_check(threads=16, orders_per_thread=1000)
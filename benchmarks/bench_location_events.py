@@ -0,0 +1,69 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from order_app import load_order_app  # noqa: E402
+
+# Bytes on the wire and consumer parse time per driver location update: the
+# full SendingCoordinates event against compact DriverLocation events with
+# absolute and delta positions, for orders with small and large Material
+# lists.
+
+
+def make_materials(count):
+    return [{"material_id": f"material-{i}", "quantity": 1 + i % 7} for i in range(count)]
+
+
+def full_events(order, samples, materials):
+    points = [{"latitude": float(lat), "longitude": float(lon)} for lat, lon in samples]
+    return [
+        order.build_route_update_event("order-1", "fs-1", materials, "Rua Direita 1, 3000-001 Coimbra",
+                                       point, points[-1])
+        for point in points
+    ]
+
+
+def compact_events(order, samples, encoding):
+    return [order.build_location_event(update)
+            for update in order.location_updates("order-1", samples, encoding)]
+
+
+def measure(events, repeat):
+    # Event Grid delivers each event as JSON text; the consumer parses it
+    bodies = [json.dumps(event, separators=(",", ":")) for event in events]
+    size = sum(len(body) for body in bodies) / len(bodies)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for body in bodies:
+            json.loads(body)
+    parse_us = (time.perf_counter() - start) / (repeat * len(bodies)) * 1e6
+    return size, parse_us
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    order = load_order_app()
+    samples = np.column_stack((
+        np.linspace(39.91344, 40.20311, args.samples),
+        np.linspace(-8.43924, -8.41137, args.samples),
+    ))
+
+    for material_count in (2, 50):
+        materials = make_materials(material_count)
+        full_size, full_parse = measure(full_events(order, samples, materials), args.repeat)
+        print(f"{material_count} materials")
+        print(f"  {'full':<16} {full_size:7.0f} bytes/update  {full_parse:6.2f} us parse")
+        for encoding in ("absolute", "delta"):
+            size, parse_us = measure(compact_events(order, samples, encoding), args.repeat)
+            print(f"  {'compact ' + encoding:<16} {size:7.0f} bytes/update  {parse_us:6.2f} us parse  "
+                  f"({full_size / size:.1f}x smaller)")
@@ -0,0 +1,185 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_azure import MapsRecordings, server_url, start_server  # noqa: E402
+from order_app import load_order_app, load_warehouse_app, make_event, make_request, quiet  # noqa: E402
+
+# End-to-end run of the order lifecycle against the local Event Grid and
+# Azure Maps stand-in, with every topic on its own path of the fake server:
+#
+#   place     http_trigger                  -> /order     (newOrderReceived)
+#   dispatch  event_grid_trigger            -> /status    (waiting_for_warehouse)
+#   reserve   warehouse main                -> /warehouse (ready_for_pickup)
+#   deliver   event_grid_trigger + playback -> /status    (route updates)
+#
+# Each stage is fed the events the previous one posted, on a fixed worker
+# thread pool like the Functions host, and reports invocations/s, latency
+# percentiles and the outbound calls it made. With --redeliver a share of
+# every stage's events is delivered twice, as Event Grid may do.
+
+MATERIALS = ["cimento", "tijolo", "areia", "ferro", "cimento_colante", "ceramica", "cal", "telha"]
+
+
+def configure(server, interval):
+    # Read by the apps at import time
+    os.environ["ORDER_EVENT_GRID_ENDPOINT"] = server_url(server, "/order/api/events")
+    os.environ["STATUS_EVENT_GRID_ENDPOINT"] = server_url(server, "/status/api/events")
+    os.environ["WAREHOUSE_EVENT_GRID_ENDPOINT"] = server_url(server, "/warehouse/api/events")
+    os.environ["AZURE_MAPS_URL"] = server_url(server, "")
+    os.environ["GEOCODE_CACHE_PATH"] = ""
+    os.environ["INVENTORY_TABLE_CONNECTION"] = ""
+    os.environ["ROUTE_PLAYBACK_MODE"] = "scheduled"
+    os.environ["ROUTE_UPDATE_INTERVAL"] = str(interval)
+
+
+def make_orders(count, addresses):
+    return [
+        {
+            "order_id": f"order-{i}",
+            "fieldServiceId": f"fs-{i % 20}",
+            "Material": [
+                {"material_id": MATERIALS[i % len(MATERIALS)], "quantity": 1 + i % 3},
+                {"material_id": MATERIALS[(i + 3) % len(MATERIALS)], "quantity": 1},
+            ],
+            "delivery_address": f"Rua Direita {i % addresses}, Coimbra",
+            "Status": "pending_warehouse",
+        }
+        for i in range(count)
+    ]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0.0
+
+
+def flush_publishers():
+    import eventgrid_publisher
+    for publisher in list(eventgrid_publisher._publishers.values()):
+        publisher.flush()
+
+
+def wait_for_playback():
+    from route_playback import get_scheduler
+    scheduler = get_scheduler()
+    while scheduler.pending():
+        time.sleep(0.01)
+    # Let the last steps hand their events to the publisher
+    time.sleep(0.05)
+
+
+def run_stage(name, server, handler, inputs, threads, after=None):
+    state = server.state
+    before = (state.requests, state.events, state.maps_requests)
+    latencies = []
+
+    def call(item):
+        start = time.perf_counter()
+        handler(item)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with quiet(), ThreadPoolExecutor(max_workers=threads) as pool:
+        for future in [pool.submit(call, item) for item in inputs]:
+            future.result()
+        if after is not None:
+            after()
+        flush_publishers()
+    elapsed = time.perf_counter() - start
+
+    posts = state.requests - before[0]
+    events = state.events - before[1]
+    maps = state.maps_requests - before[2]
+    print(f"{name:<9} {len(inputs):>6} calls {len(inputs) / elapsed:>8.0f}/s  "
+          f"p50 {percentile(latencies, 50) * 1000:7.2f} ms  p90 {percentile(latencies, 90) * 1000:7.2f} ms  "
+          f"p99 {percentile(latencies, 99) * 1000:7.2f} ms  "
+          f"{events:>6} events  {posts:>5} posts  {maps:>5} maps calls")
+    return elapsed, events
+
+
+def redeliver(events, fraction):
+    # Repeat every 1/fraction-th event right after itself
+    if fraction <= 0:
+        return events
+    step = max(1, round(1 / fraction))
+    delivered = []
+    for i, event in enumerate(events):
+        delivered.append(event)
+        if i % step == 0:
+            delivered.append(event)
+    return delivered
+
+
+def check_placed(response):
+    assert response.status_code == 200, response.get_body()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--addresses", type=int, default=200, help="distinct delivery addresses")
+    parser.add_argument("--threads", type=int, default=16, help="worker threads per stage")
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated Event Grid latency (s)")
+    parser.add_argument("--maps-latency", type=float, default=0.05, help="simulated Azure Maps latency (s)")
+    parser.add_argument("--interval", type=float, default=0.001, help="ROUTE_UPDATE_INTERVAL for playback (s)")
+    parser.add_argument("--recordings", help="JSON file of recorded Maps responses to replay")
+    parser.add_argument("--redeliver", type=float, default=0.0, help="share of events delivered twice")
+    parser.add_argument("--metrics", action="store_true", help="print the apps' telemetry snapshot")
+    args = parser.parse_args()
+
+    recordings = MapsRecordings(args.recordings) if args.recordings else None
+    server = start_server(latency=args.latency, maps_latency=args.maps_latency,
+                          recordings=recordings, capture=True)
+    configure(server, args.interval)
+    order = load_order_app()
+    warehouse = load_warehouse_app()
+
+    # Enough stock for every order, so all of them go out for delivery
+    warehouse.inventory.restock({material: args.orders * 3 for material in MATERIALS})
+
+    orders = make_orders(args.orders, args.addresses)
+    total_time = 0.0
+    total_events = 0
+
+    elapsed, events = run_stage(
+        "place", server, lambda body: check_placed(order.http_trigger(make_request(body))),
+        orders, args.threads)
+    total_time += elapsed
+    total_events += events
+
+    placed = redeliver([make_event(e) for e in server.state.take_events("/order/api/events")], args.redeliver)
+    elapsed, events = run_stage("dispatch", server, order.event_grid_trigger, placed, args.threads)
+    total_time += elapsed
+    total_events += events
+
+    waiting = redeliver([make_event(e) for e in server.state.take_events("/status/api/events")], args.redeliver)
+    elapsed, events = run_stage("reserve", server, warehouse.main, waiting, args.threads)
+    total_time += elapsed
+    total_events += events
+
+    confirmed = server.state.take_events("/warehouse/api/events")
+    ready = redeliver([make_event(e) for e in confirmed if e["data"]["Status"] == "ready_for_pickup"],
+                      args.redeliver)
+    elapsed, events = run_stage("deliver", server, order.event_grid_trigger, ready, args.threads,
+                                after=wait_for_playback)
+    total_time += elapsed
+    total_events += events
+
+    skipped = {name: count for name, count in order.snapshot()["counters"].items() if name.startswith("dedup.")}
+    if skipped:
+        print("duplicates skipped:", ", ".join(f"{name} {count}" for name, count in sorted(skipped.items())))
+    delivered = len({event.id for event in ready})
+    print(f"lifecycle {len(orders)} orders, {delivered} delivered, {total_events} events "
+          f"in {total_time:.2f}s  ({total_events / total_time:.0f} events/s, "
+          f"{delivered / total_time:.0f} orders/s)")
+    if recordings is not None:
+        print(f"maps responses replayed from recordings: {recordings.replayed}")
+    if args.metrics:
+        print(json.dumps(order.snapshot(), indent=1))
+    server.shutdown()
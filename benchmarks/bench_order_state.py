@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import azure.functions as func
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Function Order"))
+
+from order_state import OrderStateStore  # noqa: E402
+
+# Projects the status events of --orders orders into the order-state store
+# (every order placed, most of them moved on to later statuses, a share out
+# for delivery with keyframe and delta DriverLocation updates), then times
+# lookups by order_id, pages by fieldServiceId and by Status, and the same
+# questions answered by scanning the latest event of every order, which is
+# what a consumer of the raw event stream has to do.
+
+STATUSES = ["waiting_for_warehouse", "pending_inventory", "ready_for_pickup", "Delivering_Order"]
+
+
+def events(count, field_services, rng):
+    start = datetime(2024, 6, 1)
+    for i in range(count):
+        order_id = f"order-{i}"
+        when = start + timedelta(seconds=i)
+        yield "newOrderReceived", {"order_id": order_id, "fieldServiceId": f"fs-{i % field_services}",
+                                   "Status": "pending_warehouse"}, when
+        for status in STATUSES[:rng.randint(0, len(STATUSES))]:
+            when += timedelta(seconds=1)
+            if status == "Delivering_Order":
+                yield "DriverLocation", {"order_id": order_id, "seq": 1, "lat": 40.2, "lon": -8.4}, when
+                yield "DriverLocation", {"order_id": order_id, "seq": 2, "dlat": 120, "dlon": -80}, when
+            else:
+                yield "orderConfirmed", {"order_id": order_id, "Status": status}, when
+
+
+def timed_calls(calls):
+    start = time.perf_counter()
+    for call in calls:
+        call()
+    return (time.perf_counter() - start) / len(calls) * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=1000000)
+    parser.add_argument("--field-services", type=int, default=5000)
+    parser.add_argument("--lookups", type=int, default=100000)
+    parser.add_argument("--scans", type=int, default=5, help="scan-based queries for the baseline")
+    parser.add_argument("--memory", action="store_true", help="trace allocations while loading (slower)")
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    store = OrderStateStore()
+    latest = {}
+    if args.memory:
+        tracemalloc.start()
+    count = 0
+    start = time.perf_counter()
+    for event_type, data, event_time in events(args.orders, args.field_services, rng):
+        store.apply(event_type, data, event_time)
+        count += 1
+    elapsed = time.perf_counter() - start
+    print(f"projected {count} events for {len(store)} orders in {elapsed:.1f}s ({count / elapsed:.0f} events/s)")
+    if args.memory:
+        print(f"store size {tracemalloc.get_traced_memory()[0] / 1024 / 1024:.0f} MB")
+        tracemalloc.stop()
+    print(json.dumps(store.stats()["statuses"]))
+
+    # Baseline: the last event seen per order, as a stream consumer keeps it
+    rng = random.Random(11)
+    for event_type, data, event_time in events(args.orders, args.field_services, rng):
+        state = latest.setdefault(data["order_id"], {})
+        state.update(data)
+        state["Status"] = data.get("Status", "Delivering_Order")
+    rows = list(latest.values())
+
+    ids = [f"order-{rng.randrange(args.orders)}" for _ in range(args.lookups)]
+    services = [f"fs-{rng.randrange(args.field_services)}" for _ in range(args.lookups // 10)]
+    print(f"get(order_id)                        {timed_calls([lambda o=o: store.get(o) for o in ids]):9.2f} us")
+    print(f"fieldServiceId page (100)            "
+          f"{timed_calls([lambda f=f: store.query(field_service_id=f) for f in services]):9.2f} us")
+    print(f"fieldServiceId + status page (100)   "
+          f"{timed_calls([lambda f=f: store.query(f, 'ready_for_pickup') for f in services]):9.2f} us")
+
+    cursor = 0
+    pages = 0
+    start = time.perf_counter()
+    while cursor is not None and pages < 1000:
+        _, cursor = store.query(status="pending_inventory", cursor=cursor, limit=100)
+        pages += 1
+    print(f"status page (100), 1000 pages deep   {(time.perf_counter() - start) / pages * 1e6:9.2f} us")
+
+    scan = [lambda f=f: [r for r in rows if r["fieldServiceId"] == f and r["Status"] == "ready_for_pickup"][:100]
+            for f in services[:args.scans]]
+    print(f"scan for fieldServiceId + status     {timed_calls(scan):9.0f} us")
+
+    # Through the HTTP route, including the response encoding
+    os.environ.setdefault("STARTUP_WARMUP", "off")
+    from order_app import load_order_app, quiet
+    with quiet():
+        app = load_order_app()
+    import order_state
+    order_state._store = store
+    request = func.HttpRequest(method="GET", url="http://localhost/api/orders", body=b"",
+                               params={"fieldServiceId": services[0], "limit": "100"})
+    print(f"GET orders?fieldServiceId (100)      {timed_calls([lambda: app.orders(request)] * 1000):9.2f} us")
@@ -0,0 +1,80 @@
+import argparse
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Function Order"))
+
+from eventgrid_publisher import EventGridPublisher  # noqa: E402
+from fake_azure import server_url, start_server  # noqa: E402
+
+# Compares one requests.post per event (the previous behaviour) against the
+# pooled, batching publisher under a burst of concurrent orders.
+
+
+def make_event(i):
+    return {
+        "id": str(uuid.uuid4()),
+        "eventType": "newOrderReceived",
+        "subject": "NewOrder",
+        "eventTime": datetime.utcnow().isoformat(),
+        "data": {
+            "order_id": f"order-{i}",
+            "fieldServiceId": "fs-1",
+            "Material": [{"material_id": "cimento", "quantity": 2}],
+            "delivery_address": "Rua Direita 1, Coimbra",
+            "Status": "pending_warehouse",
+            "driverLocation": {},
+        },
+        "dataVersion": "1.0",
+    }
+
+
+def post_per_event(url, events, workers):
+    def send(event):
+        return requests.post(url, json=[event], headers={"aeg-sas-key": "bench"}).status_code
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(send, events))
+
+
+def post_with_publisher(url, events, workers):
+    publisher = EventGridPublisher(url, "bench")
+
+    def send(event):
+        return publisher.publish(event).result().status_code
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        statuses = list(pool.map(send, events))
+    publisher.close()
+    return statuses
+
+
+def run(name, func, url, events, workers, server):
+    server.state.reset()
+    start = time.perf_counter()
+    statuses = func(url, events, workers)
+    elapsed = time.perf_counter() - start
+    assert all(status == 200 for status in statuses)
+    print(f"{name:<16} {len(events) / elapsed:>10.0f} events/s  "
+          f"{server.state.requests:>6} requests  {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=32, help="concurrent invocations")
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated Event Grid latency (s)")
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency)
+    url = server_url(server)
+    events = [make_event(i) for i in range(args.events)]
+    run("per-event post", post_per_event, url, events, args.workers, server)
+    run("publisher", post_with_publisher, url, events, args.workers, server)
+    server.shutdown()
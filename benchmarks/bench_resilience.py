@@ -0,0 +1,79 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Function Order"))
+
+from fake_azure import server_url, start_server  # noqa: E402
+from resilient_http import CircuitBreaker, CircuitOpenError, ResilientClient  # noqa: E402
+
+# Geocode lookups during an upstream slowdown (a share of Maps responses
+# take seconds) and an outage (every response is a 503): plain requests
+# without a timeout against the resilient client with timeouts and retries,
+# with hedging, and with the circuit breaker open.
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run(name, server, call, url, calls, threads):
+    server.state.reset()
+    latencies = []
+    failures = 0
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            ok = call(f"{url}&query=Rua%20Direita%20{i}").status_code == 200
+        except (requests.RequestException, CircuitOpenError):
+            ok = False
+        latencies.append(time.perf_counter() - start)
+        return ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        failures = sum(not ok for ok in pool.map(one, range(calls)))
+    elapsed = time.perf_counter() - start
+    print(f"{name:<26} {calls / elapsed:7.0f} calls/s  p50 {percentile(latencies, 50) * 1000:7.1f} ms  "
+          f"p99 {percentile(latencies, 99) * 1000:7.1f} ms  max {max(latencies) * 1000:7.1f} ms  "
+          f"{failures:>4} failed  {server.state.maps_requests:>5} upstream")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.05, help="normal Maps latency (s)")
+    parser.add_argument("--slow-fraction", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=4.0)
+    args = parser.parse_args()
+
+    server = start_server(maps_latency=args.latency)
+    url = server_url(server, "/search/address/json?api-version=1.0")
+    settings = {"read_timeout": 1.0, "retries": 2, "backoff": 0.05, "deadline": 3.0}
+
+    print(f"slowdown: {args.slow_fraction:.0%} of responses take {args.slow_latency:.1f}s more")
+    server.state.slow_fraction = args.slow_fraction
+    server.state.slow_latency = args.slow_latency
+    run("requests, no timeout", server, requests.get, url, args.calls, args.threads)
+    client = ResilientClient("maps", breaker=CircuitBreaker(10 ** 9), pool_maxsize=args.threads, **settings)
+    run("timeouts + retries", server, client.get, url, args.calls, args.threads)
+    hedged = ResilientClient("maps", breaker=CircuitBreaker(10 ** 9), pool_maxsize=args.threads * 2,
+                             hedge_after=0.2, **settings)
+    run("timeouts + retries + hedge", server, hedged.get, url, args.calls, args.threads)
+
+    print("outage: every response is a 503")
+    server.state.slow_fraction = 0.0
+    server.state.error_fraction = 1.0
+    no_breaker = ResilientClient("maps", breaker=CircuitBreaker(10 ** 9), pool_maxsize=args.threads, **settings)
+    run("timeouts + retries", server, no_breaker.get, url, args.calls, args.threads)
+    breaker = ResilientClient("maps", breaker=CircuitBreaker(5, 30.0), pool_maxsize=args.threads, **settings)
+    run("with circuit breaker", server, breaker.get, url, args.calls, args.threads)
+    server.shutdown()
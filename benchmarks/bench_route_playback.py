@@ -0,0 +1,71 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Function Order"))
+
+from eventgrid_publisher import EventGridPublisher  # noqa: E402
+from fake_azure import server_url, start_server  # noqa: E402
+from route_playback import PlaybackScheduler, schedule_playback, select_route_points  # noqa: E402
+
+# Starts N concurrent route playbacks on a single scheduler and publisher and
+# reports how late each step fired. A playback mode is sustainable for N
+# deliveries while the p99 lateness stays well below the update interval.
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run(deliveries, interval, points, publisher):
+    scheduler = PlaybackScheduler()
+    route = [{"latitude": 39.9 + i * 1e-4, "longitude": -8.4 + i * 1e-4} for i in range(points)]
+    steps = list(enumerate(select_route_points(route)))
+    lateness = []
+    lock = threading.Lock()
+    done = threading.Event()
+    remaining = [deliveries * len(steps)]
+
+    start = time.monotonic()
+    for order in range(deliveries):
+        def send_step(step, order=order):
+            position, (_, point) = step
+            late = time.monotonic() - (start + position * interval)
+            publisher.publish({"id": f"{order}-{position}", "eventType": "SendingCoordinates",
+                               "data": {"order_id": order, "currentLocation": point}})
+            with lock:
+                lateness.append(late)
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    done.set()
+
+        schedule_playback(steps, send_step, interval, scheduler=scheduler)
+    handoff = time.monotonic() - start
+
+    done.wait()
+    publisher.flush()
+    return handoff, lateness
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--deliveries", type=int, nargs="+", default=[100, 500, 1000, 5000])
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between route updates")
+    parser.add_argument("--points", type=int, default=500, help="route points per delivery")
+    parser.add_argument("--latency", type=float, default=0.02, help="simulated Event Grid latency (s)")
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency)
+    publisher = EventGridPublisher(server_url(server), "bench")
+    for deliveries in args.deliveries:
+        server.state.reset()
+        handoff, lateness = run(deliveries, args.interval, args.points, publisher)
+        print(f"{deliveries:>6} concurrent playbacks  hand-off {handoff * 1000:8.1f} ms  "
+              f"lateness p50 {percentile(lateness, 50) * 1000:6.1f} ms  "
+              f"p99 {percentile(lateness, 99) * 1000:6.1f} ms  "
+              f"{server.state.events} events in {server.state.requests} posts")
+    publisher.close()
+    server.shutdown()
@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_azure import server_url, start_server  # noqa: E402
+from order_app import load_order_app, make_request, quiet  # noqa: E402
+
+# A day's ETA planning: every order against every depot, once as one route
+# call per pair (plus one geocode per address) and once through the
+# travel_time_matrix endpoint, then again to show the memoized table.
+
+DEPOTS = [
+    {"warehouse_id": "coimbra", "latitude": 39.91344, "longitude": -8.43924},
+    {"warehouse_id": "aveiro", "latitude": 40.64427, "longitude": -8.64554},
+    {"warehouse_id": "viseu", "latitude": 40.65664, "longitude": -7.91249},
+]
+
+
+def configure(server):
+    # Read by the app at import time
+    path = os.path.join(tempfile.mkdtemp(), "warehouses.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(DEPOTS, f)
+    os.environ["WAREHOUSES_PATH"] = path
+    os.environ["AZURE_MAPS_URL"] = server_url(server, "")
+    os.environ["GEOCODE_CACHE_PATH"] = ""
+
+
+def reset_caches(order):
+    from geocoding import GeocodeCache
+    from routing import RouteCache
+    from travel_matrix import TravelTimeCache
+    order.get_geocode_cache = lambda cache=GeocodeCache(path=None): cache
+    order.get_route_cache = lambda cache=RouteCache(): cache
+    order.get_travel_time_cache = lambda cache=TravelTimeCache(): cache
+
+
+def per_pair(order, orders):
+    depots = order.get_warehouse_registry().warehouses()
+    table = []
+    for depot in depots:
+        row = []
+        for item in orders:
+            delivery = order.get_coordinates_from_address(item["delivery_address"])
+            route = order.get_route(depot.coordinates(), delivery)
+            row.append(route.travel_time_seconds if route else None)
+        table.append(row)
+    return table
+
+
+def matrix(order, orders):
+    response = order.travel_time_matrix(make_request({"orders": orders}, "travel_time_matrix"))
+    assert response.status_code == 200, response.get_body()
+    return json.loads(response.get_body())["travel_time_seconds"]
+
+
+def run(name, server, func):
+    server.state.reset()
+    start = time.perf_counter()
+    with quiet():
+        table = func()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<18} {elapsed * 1000:9.1f} ms  {server.state.maps_requests:>5} Maps calls")
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02, help="simulated Azure Maps latency (s)")
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency)
+    configure(server)
+    order = load_order_app()
+    orders = [
+        {"order_id": f"order-{i}", "delivery_address": f"Rua Direita {i}, Coimbra"}
+        for i in range(args.orders)
+    ]
+
+    reset_caches(order)
+    expected = run("per pair", server, lambda: per_pair(order, orders))
+    reset_caches(order)
+    table = run("matrix", server, lambda: matrix(order, orders))
+    run("matrix (memoized)", server, lambda: matrix(order, orders))
+    assert table == expected
+    server.shutdown()
@@ -0,0 +1,64 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Function Order"))
+
+import fast_json  # noqa: E402
+from order_schema import parse_order_body  # noqa: E402
+
+# Validation throughput of the previous inline checks (json.loads + field
+# loop) against order_schema.parse_order_body, on valid and invalid bodies.
+
+
+def legacy_parse(body):
+    request_body = json.loads(body)
+    if isinstance(request_body, dict) and 'data' in request_body:
+        order_data = request_body['data']
+    else:
+        order_data = request_body
+    for field in ["order_id", "fieldServiceId", "Material", "delivery_address", "Status"]:
+        if field not in order_data:
+            return None, f"Missing required field: {field}"
+    materials = order_data["Material"]
+    if not isinstance(materials, list) or not all(isinstance(item, dict) for item in materials):
+        return None, "Invalid format for 'Material'."
+    return order_data, None
+
+
+def make_body(lines, valid=True):
+    order = {
+        "order_id": "order-1",
+        "fieldServiceId": "fs-1",
+        "Material": [{"material_id": f"sku-{i}", "quantity": 1 + i % 5} for i in range(lines)],
+        "delivery_address": "Rua Direita 1, Coimbra",
+        "Status": "pending_warehouse",
+        "driverLocation": {},
+    }
+    if not valid:
+        del order["Status"]
+    return json.dumps({"data": order}).encode("utf-8")
+
+
+def bench(name, func, body, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(body)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<34} {iterations / elapsed:>10.0f} orders/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=50000)
+    parser.add_argument("--lines", type=int, default=10, help="Material lines per order")
+    args = parser.parse_args()
+
+    print(f"JSON backend: {'orjson' if fast_json.orjson is not None else 'json'}")
+    for valid in (True, False):
+        body = make_body(args.lines, valid)
+        label = "valid" if valid else "invalid"
+        bench(f"legacy ({label})", legacy_parse, body, args.iterations)
+        bench(f"order_schema ({label})", parse_order_body, body, args.iterations)
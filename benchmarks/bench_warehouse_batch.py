@@ -0,0 +1,81 @@
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Function Warehouse"))
+
+import function_app as warehouse  # noqa: E402
+from backorders import BackorderQueue  # noqa: E402
+from fake_azure import server_url, start_server  # noqa: E402
+from inventory import InventoryStore  # noqa: E402
+from order_app import quiet  # noqa: E402
+
+# Morning-peak simulation: the same burst of orders handled one event per
+# invocation (process_event) and as Event Grid batches (process_events).
+
+
+def make_events(count):
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "eventType": "newOrderReceived",
+            "subject": "NewOrder",
+            "eventTime": datetime.utcnow().isoformat(),
+            "data": {
+                "order_id": f"order-{i}",
+                "fieldServiceId": "fs-1",
+                "Material": [{"material_id": "cimento", "quantity": 1},
+                             {"material_id": "tijolo", "quantity": 2}],
+                "delivery_address": "Rua Direita 1, Coimbra",
+                "Status": "waiting_for_warehouse",
+                "driverLocation": {},
+            },
+            "dataVersion": "1.0",
+        }
+        for i in range(count)
+    ]
+
+
+def reset_inventory(orders):
+    warehouse.inventory = InventoryStore([
+        {"material_id": "cimento", "quantity": orders},
+        {"material_id": "tijolo", "quantity": orders * 2},
+    ])
+    # Short orders must wait on the store that is actually used
+    warehouse.backorders = BackorderQueue(warehouse.inventory)
+
+
+def run(name, func, server, count):
+    server.state.reset()
+    start = time.perf_counter()
+    with quiet():
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<20} {count / elapsed:>8.0f} orders/s  {elapsed / count * 1e6:>8.0f} us/order  "
+          f"{server.state.requests:>5} posts")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated Event Grid latency (s)")
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency)
+    warehouse.EVENT_GRID_ENDPOINT = server_url(server)
+    events = make_events(args.orders)
+
+    reset_inventory(args.orders)
+    run("per event", lambda: [warehouse.process_event(e["data"]) for e in events], server, args.orders)
+
+    reset_inventory(args.orders)
+    run("batched", lambda: [
+        warehouse.process_events(events[i:i + args.batch_size])
+        for i in range(0, len(events), args.batch_size)
+    ], server, args.orders)
+    server.shutdown()
@@ -0,0 +1,91 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Function Order"))
+
+from warehouses import Warehouse, WarehouseRegistry, distance_meters, required_quantities  # noqa: E402
+
+# Nearest stocked depot for random delivery points in mainland Portugal and
+# Spain: grid index lookups against a scan of every depot, which must agree.
+# Then the worst case: 50 depots plus the Azores and Madeira, and orders no
+# depot can fill, answered with the nearest depot at all.
+
+MATERIALS = ["cimento", "tijolo", "areia", "ferro", "cimento_colante", "ceramica", "cal", "telha"]
+
+
+def random_point(rng):
+    return rng.uniform(36.0, 43.8), rng.uniform(-9.5, 3.3)
+
+
+def make_warehouses(count, rng):
+    warehouses = []
+    for i in range(count):
+        lat, lon = random_point(rng)
+        stock = {material: rng.choice((0, 0, 5, 20, 100)) for material in MATERIALS}
+        warehouses.append(Warehouse(f"depot-{i}", lat, lon, stock))
+    return warehouses
+
+
+def make_orders(count, rng):
+    return [
+        (random_point(rng), [{"material_id": material, "quantity": rng.randint(1, 20)}
+                             for material in rng.sample(MATERIALS, rng.randint(1, 3))])
+        for _ in range(count)
+    ]
+
+
+def linear_nearest(warehouses, lat, lon, materials):
+    needed = required_quantities(materials)
+    candidates = [(distance_meters(lat, lon, w.lat, w.lon), w) for w in warehouses if w.can_fill(needed)]
+    return min(candidates, key=lambda pair: pair[0], default=None)
+
+
+def islands_case(lookups, rng):
+    warehouses = make_warehouses(50, rng)
+    warehouses.append(Warehouse("azores", 37.74, -25.67, {"cimento": 5}))
+    warehouses.append(Warehouse("madeira", 32.65, -16.91, {"cimento": 5}))
+    registry = WarehouseRegistry(warehouses)
+    points = [random_point(rng) for _ in range(lookups)]
+    unfillable = [{"material_id": "cimento", "quantity": 1000}]
+
+    start = time.perf_counter()
+    results = [registry.nearest_with_fallback(lat, lon, unfillable) for lat, lon in points]
+    elapsed = time.perf_counter() - start
+    for (lat, lon), (filling, closest) in zip(points[:500], results):
+        assert filling is None
+        assert closest[1] is linear_nearest(warehouses, lat, lon, None)[1]
+    print(f"{len(warehouses):>6} depots  no depot can fill, with fallback "
+          f"{elapsed / len(points) * 1e6:8.1f} us/lookup")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lookups", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    for depots in (100, 1000, 5000, 20000):
+        rng = random.Random(args.seed)
+        warehouses = make_warehouses(depots, rng)
+        orders = make_orders(args.lookups, rng)
+        registry = WarehouseRegistry(warehouses)
+
+        start = time.perf_counter()
+        indexed = [registry.nearest(lat, lon, materials) for (lat, lon), materials in orders]
+        grid_time = time.perf_counter() - start
+
+        checked = orders[:500]
+        start = time.perf_counter()
+        expected = [linear_nearest(warehouses, lat, lon, materials) for (lat, lon), materials in checked]
+        scan_time = (time.perf_counter() - start) / len(checked) * len(orders)
+
+        for got, want in zip(indexed, expected):
+            assert (got[0][1] if got else None) is (want[1] if want else None)
+
+        print(f"{depots:>6} depots  grid {grid_time / len(orders) * 1e6:8.1f} us/lookup   "
+              f"scan {scan_time / len(orders) * 1e6:9.1f} us/lookup")
+
+    islands_case(args.lookups, random.Random(args.seed))
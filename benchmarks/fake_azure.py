@@ -0,0 +1,296 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+from urllib.request import urlopen
+
+# Local stand-in for the Event Grid topics and Azure Maps endpoints used by the
+# function apps. Accepts POSTs of event arrays on any path (one path per
+# topic) and answers Maps geocode and route GETs, optionally after a
+# simulated latency, and counts requests so benchmarks can report them.
+#
+# Maps answers come from a recordings file when it has the query, and are
+# synthesized otherwise. Run with --record-from https://atlas.microsoft.com
+# --maps-key KEY once to fill the file from the real service.
+
+MAPS_PATHS = {
+    "/search/address/json": "geocode",
+    "/route/directions/json": "route",
+}
+
+MAPS_BATCH_PATHS = ("/search/address/batch/sync/json", "/route/matrix/json")
+
+
+class MapsRecordings:
+    # {"geocode": {query: body}, "route": {query: body}} kept in a JSON file
+
+    def __init__(self, path=None, upstream=None, key=None):
+        self.path = path
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.key = key
+        self.lock = threading.Lock()
+        self.responses = {"geocode": {}, "route": {}}
+        self.replayed = 0
+        self.recorded = 0
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for kind, entries in json.load(f).items():
+                    self.responses.setdefault(kind, {}).update(entries)
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.responses.values())
+
+    def lookup(self, url_path, query):
+        kind = MAPS_PATHS[url_path]
+        with self.lock:
+            body = self.responses[kind].get(query)
+            if body is not None:
+                self.replayed += 1
+                return body
+        if self.upstream:
+            body = self._fetch(url_path, query)
+            with self.lock:
+                self.responses[kind][query] = body
+                self.recorded += 1
+            return body
+        return None
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            data = json.dumps(self.responses, indent=1, sort_keys=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(data)
+
+    def _fetch(self, url_path, query):
+        params = {"api-version": "1.0", "subscription-key": self.key, "query": query}
+        if url_path == "/route/directions/json":
+            params["instructionsType"] = "coded"
+        with urlopen(f"{self.upstream}{url_path}?{urlencode(params)}", timeout=15) as response:
+            return json.loads(response.read())
+
+
+class FakeAzureState:
+    def __init__(self, latency=0.0, maps_latency=None, recordings=None, capture=False):
+        self.latency = latency
+        self.maps_latency = latency if maps_latency is None else maps_latency
+        # Fault injection for Maps GETs: a share of responses is delayed by
+        # slow_latency, and a share answered with 503
+        self.slow_fraction = 0.0
+        self.slow_latency = 0.0
+        self.error_fraction = 0.0
+        self.recordings = recordings
+        self.capture = capture
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.events = 0
+        self.maps_requests = 0
+        self.topics = defaultdict(list)
+
+    def maps_fault(self):
+        # (extra delay, fail) for one Maps request
+        delay = self.slow_latency if random.random() < self.slow_fraction else 0.0
+        return delay, random.random() < self.error_fraction
+
+    def record_maps_request(self):
+        with self.lock:
+            self.maps_requests += 1
+
+    def record_events(self, count, path="/api/events", events=None):
+        with self.lock:
+            self.requests += 1
+            self.events += count
+            if self.capture and events is not None:
+                self.topics[path].extend(events)
+
+    def take_events(self, path="/api/events"):
+        # Captured events posted to one topic path, oldest first
+        with self.lock:
+            return self.topics.pop(path, [])
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.events = 0
+            self.maps_requests = 0
+            self.topics.clear()
+
+
+class FakeAzureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Send headers and body in one segment; otherwise keep-alive clients
+    # stall on Nagle plus delayed ACK and pooled connections look slow
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        state = self.server.state
+        url = urlparse(self.path)
+        query = parse_qs(url.query).get("query", [""])[0]
+        maps_path = next((path for path in MAPS_PATHS if url.path.endswith(path)), None)
+        if maps_path is None:
+            self._reply(404, b"")
+            return
+        delay, fail = state.maps_fault()
+        if state.maps_latency or delay:
+            time.sleep(state.maps_latency + delay)
+        state.record_maps_request()
+        if fail:
+            self._reply(503, b"Service Unavailable")
+            return
+        body = None
+        if state.recordings is not None:
+            body = state.recordings.lookup(maps_path, query)
+        if body is None:
+            if maps_path == "/search/address/json":
+                body = geocode_response(query)
+            else:
+                body = route_response(query)
+        self._reply(200, json.dumps(body).encode("utf-8"))
+
+    def do_POST(self):
+        state = self.server.state
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        url_path = urlparse(self.path).path
+        if url_path.endswith(MAPS_BATCH_PATHS):
+            self._maps_batch(url_path, body)
+            return
+        if state.latency:
+            time.sleep(state.latency)
+        try:
+            events = json.loads(body)
+        except ValueError:
+            self._reply(400, b"Invalid JSON")
+            return
+        if not isinstance(events, list):
+            self._reply(400, b"Expected an array of events")
+            return
+        state.record_events(len(events), urlparse(self.path).path, events)
+        self._reply(200, b"")
+
+    def _maps_batch(self, url_path, body):
+        state = self.server.state
+        if state.maps_latency:
+            time.sleep(state.maps_latency)
+        state.record_maps_request()
+        try:
+            request = json.loads(body)
+        except ValueError:
+            self._reply(400, b"Invalid JSON")
+            return
+        if url_path.endswith("/search/address/batch/sync/json"):
+            items = []
+            for item in request.get("batchItems", []):
+                query = parse_qs(item.get("query", "").lstrip("?")).get("query", [""])[0]
+                response = None
+                if state.recordings is not None:
+                    response = state.recordings.lookup("/search/address/json", query)
+                items.append({"statusCode": 200, "response": response or geocode_response(query)})
+            result = {"batchItems": items}
+        else:
+            result = route_matrix_response(request)
+        self._reply(200, json.dumps(result).encode("utf-8"))
+
+    def do_HEAD(self):
+        # Connection warm-up from the apps; not counted as a request
+        self._reply(200, b"")
+
+    def _reply(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def geocode_response(address):
+    # Stable pseudo-random position around Coimbra for each address
+    digest = hashlib.sha1(address.encode("utf-8")).digest()
+    lat = 40.0 + (digest[0] - 128) / 256
+    lon = -8.4 + (digest[1] - 128) / 256
+    return {"results": [{"position": {"lat": lat, "lon": lon}}]}
+
+
+def route_response(query, points=200):
+    # Straight line between the two query positions at 50 km/h
+    start, end = [tuple(map(float, part.split(","))) for part in query.split(":")[:2]]
+    route_points = [
+        {"latitude": start[0] + (end[0] - start[0]) * i / (points - 1),
+         "longitude": start[1] + (end[1] - start[1]) * i / (points - 1)}
+        for i in range(points)
+    ]
+    length = int(111000 * (abs(end[0] - start[0]) + abs(end[1] - start[1])))
+    summary = {"lengthInMeters": length, "travelTimeInSeconds": int(length / 13.9)}
+    return {"routes": [{"summary": summary, "legs": [{"summary": summary, "points": route_points}]}]}
+
+
+def route_matrix_response(request):
+    # Same straight-line, 50 km/h model as route_response for every pair
+    origins = request["origins"]["coordinates"]
+    destinations = request["destinations"]["coordinates"]
+    matrix = []
+    for origin_lon, origin_lat in origins:
+        row = []
+        for lon, lat in destinations:
+            length = int(111000 * (abs(lat - origin_lat) + abs(lon - origin_lon)))
+            summary = {"lengthInMeters": length, "travelTimeInSeconds": int(length / 13.9)}
+            row.append({"statusCode": 200, "response": {"routeSummary": summary}})
+        matrix.append(row)
+    cells = len(origins) * len(destinations)
+    return {"formatVersion": "0.0.1", "matrix": matrix,
+            "summary": {"successfulRoutes": cells, "totalRoutes": cells}}
+
+
+class FakeAzureServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def start_server(host="127.0.0.1", port=0, latency=0.0, maps_latency=None, recordings=None, capture=False):
+    server = FakeAzureServer((host, port), FakeAzureHandler)
+    server.state = FakeAzureState(latency, maps_latency, recordings, capture)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def server_url(server, path="/api/events"):
+    # Use path="" for the Azure Maps base URL
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}{path}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Event Grid and Azure Maps stand-in")
+    parser.add_argument("--port", type=int, default=7071)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--maps-latency", type=float, default=None, help="seconds added to Maps responses only")
+    parser.add_argument("--recordings", help="JSON file of recorded Maps responses to replay")
+    parser.add_argument("--record-from", help="real Maps base URL to fetch (and record) unknown queries from")
+    parser.add_argument("--maps-key", default=os.environ.get("AZURE_MAPS_KEY"))
+    args = parser.parse_args()
+    recordings = None
+    if args.recordings or args.record_from:
+        recordings = MapsRecordings(args.recordings, args.record_from, args.maps_key)
+    server = start_server(port=args.port, latency=args.latency, maps_latency=args.maps_latency,
+                          recordings=recordings)
+    print(f"Event Grid: {server_url(server)}  Azure Maps: {server_url(server, '')}")
+    if recordings is not None:
+        print(f"{len(recordings)} recorded Maps responses")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        if recordings is not None and recordings.recorded:
+            recordings.save()
+            print(f"Saved {recordings.recorded} new recordings to {recordings.path}")
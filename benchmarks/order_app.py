@@ -0,0 +1,88 @@
+import contextlib
+import importlib.util
+import json
+import logging
+import os
+import sys
+import types
+from datetime import datetime
+
+import azure.functions as func
+
+ORDER_APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Function Order")
+WAREHOUSE_APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Function Warehouse")
+
+# http_function.py is written as part of a package ("from . import app"), so
+# load it under a synthetic package that provides its own FunctionApp.
+
+
+def load_http_function():
+    # The app modules import each other absolutely, as on the Functions host
+    if ORDER_APP_DIR not in sys.path:
+        sys.path.insert(0, ORDER_APP_DIR)
+    package = sys.modules.get("order_app_pkg")
+    if package is None:
+        package = types.ModuleType("order_app_pkg")
+        package.__path__ = [ORDER_APP_DIR]
+        package.app = func.FunctionApp(http_auth_level=func.AuthLevel.FUNCTION)
+        sys.modules["order_app_pkg"] = package
+    import order_app_pkg.http_function as http_function
+    return http_function
+
+
+def load_function_app(name, app_dir):
+    # Both apps have a function_app.py, so load each under its own name. The
+    # shared modules (publisher, schema, telemetry) are identical copies and
+    # resolve to the Order app's; inventory modules only exist in Warehouse.
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    for path in (ORDER_APP_DIR, WAREHOUSE_APP_DIR):
+        if path not in sys.path:
+            sys.path.append(path)
+    spec = importlib.util.spec_from_file_location(name, os.path.join(app_dir, "function_app.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_order_app():
+    return load_function_app("order_function_app", ORDER_APP_DIR)
+
+
+def load_warehouse_app():
+    return load_function_app("warehouse_function_app", WAREHOUSE_APP_DIR)
+
+
+def make_event(event, topic="local"):
+    # func.EventGridEvent for an event dict as posted to a topic
+    return func.EventGridEvent(
+        id=event["id"],
+        data=event["data"],
+        topic=topic,
+        subject=event.get("subject", ""),
+        event_type=event.get("eventType", ""),
+        event_time=datetime.fromisoformat(event["eventTime"]) if event.get("eventTime") else None,
+        data_version=event.get("dataVersion", "1.0"),
+    )
+
+
+def make_request(body, route="http_trigger"):
+    return func.HttpRequest(
+        method="POST",
+        url=f"http://localhost/api/{route}",
+        body=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+
+
+@contextlib.contextmanager
+def quiet():
+    # Mutes the apps' log records (failed sends, retries) while a benchmark
+    # drives them; without a handler, warnings and errors go to stderr
+    logging.disable(logging.CRITICAL)
+    try:
+        yield
+    finally:
+        logging.disable(logging.NOTSET)